@@ -1,214 +1,325 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, url_for
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+import atexit
+import hmac
 import json
+import math
+import os
+import queue
 import re
 
+from conversation_journal import ConversationJournal
+from intent_matcher import normalizar
+from knowledge_base import CAMINHO_PADRAO as CAMINHO_BASE_PADRAO, KnowledgeBase, carregar_base
+from metrics import Metricas
+from protocol_ids import DIRETORIO_PADRAO as PROTOCOLO_DIRETORIO_PADRAO, ProtocolGenerator, gerador_padrao
+from rate_limiter import ConcurrencyLimiter, TokenBucketLimiter
+from response_catalog import ResponseCache, ResponseCatalog, evento_sse
+from session_snapshot import SessionSnapshotter
+from session_sweeper import SessionSweeper
+from session_store import SessionLocks, SessionStore, criar_session_backend
+from static_assets import COMPRIMIVEIS, StaticAssets, Variantes, comprimir, escolher_codificacao
+from tenant_registry import SharedStore, TenantRegistry
+
 app = Flask(__name__)
 
-# Armazenar conversas em memória (em produção, usar banco de dados)
-conversations = {}
-
-# Base de conhecimento sobre serviços do terminal
-SERVICOS_TERMINAL = {
-    "transporte": {
-        "titulo": "🚌 Transporte Rodoviário",
-        "descricao": "Oferecemos passagens para diversas cidades com múltiplas empresas parceiras",
-        "detalhes": [
-            "• Ônibus executivo, convencional e leito",
-            "• Destinos nacionais e internacionais",
-            "• Horários flexíveis ao longo do dia",
-            "• Preços competitivos"
-        ]
-    },
-    "encomendas": {
-        "titulo": "📦 Envio de Encomendas",
-        "descricao": "Serviço de envio e recebimento de pacotes",
-        "detalhes": [
-            "• Envio para todo o Brasil",
-            "• Rastreamento em tempo real",
-            "• Seguro opcional",
-            "• Entrega expressa disponível"
-        ]
-    },
-    "guarda_volumes": {
-        "titulo": "🎒 Guarda-Volumes",
-        "descricao": "Armazenamento seguro de bagagens",
-        "detalhes": [
-            "• Armários de diversos tamanhos",
-            "• Sistema de segurança 24h",
-            "• Preços por hora ou diária",
-            "• Acesso facilitado"
-        ]
-    },
-    "alimentacao": {
-        "titulo": "🍽️ Praça de Alimentação",
-        "descricao": "Diversas opções gastronômicas",
-        "detalhes": [
-            "• Restaurantes e lanchonetes",
-            "• Cafeterias",
-            "• Lojas de conveniência",
-            "• Opções vegetarianas/veganas"
-        ]
-    },
-    "servicos_gerais": {
-        "titulo": "🏢 Serviços Gerais",
-        "descricao": "Outros serviços disponíveis no terminal",
-        "detalhes": [
-            "• Caixas eletrônicos 24h",
-            "• Farmácia",
-            "• Banheiros e fraldário",
-            "• Wi-Fi gratuito",
-            "• Carregadores de celular",
-            "• Informações turísticas"
-        ]
-    }
-}
+# Sessões (contexto + histórico da conversa), com limite de tamanho. Com mais
+# de um worker, use SESSAO_BACKEND=sqlite para compartilhar o estado entre eles
+sessoes = criar_session_backend(
+    os.environ.get('SESSAO_BACKEND', 'memoria'),
+    caminho=os.environ.get('SESSAO_SQLITE_CAMINHO', 'sessoes.db'),
+    max_sessoes=int(os.environ.get('SESSAO_MAX', 10000)),
+    ttl=float(os.environ.get('SESSAO_TTL_SEGUNDOS', 1800)),
+    max_historico=int(os.environ.get('SESSAO_MAX_HISTORICO', 50))
+)
 
-HORARIOS_FUNCIONAMENTO = {
-    "terminal": "24 horas por dia, 7 dias por semana",
-    "bilheteria": "Das 5h às 23h",
-    "guarda_volumes": "Das 6h às 22h",
-    "praca_alimentacao": "Das 6h às 23h",
-    "informacoes": "Das 6h às 22h"
-}
+# Snapshot das sessões em memória, gravado em segundo plano e ao encerrar. Ao
+# reiniciar, cada sessão é lida do arquivo no primeiro acesso a ela, então
+# coletas de contato em andamento sobrevivem a um deploy. Com
+# SESSAO_SNAPSHOT_CAMINHO vazio (ou o backend SQLite) não há snapshot
+snapshot_sessoes = None
+if isinstance(sessoes, SessionStore) and os.environ.get('SESSAO_SNAPSHOT_CAMINHO', 'sessoes.snapshot'):
+    snapshot_sessoes = SessionSnapshotter(
+        sessoes,
+        os.environ.get('SESSAO_SNAPSHOT_CAMINHO', 'sessoes.snapshot'),
+        intervalo=float(os.environ.get('SESSAO_SNAPSHOT_INTERVALO', 30))
+    )
+    snapshot_sessoes.iniciar()
+    atexit.register(snapshot_sessoes.parar)
+
+# Varredura periódica: expira sessões ociosas e estima a memória de cada uma
+# (resultado em /admin/sessoes). SESSAO_VARREDURA_INTERVALO=0 desliga
+varredura_sessoes = SessionSweeper(
+    sessoes,
+    intervalo=float(os.environ.get('SESSAO_VARREDURA_INTERVALO', 10)),
+    maiores=int(os.environ.get('SESSAO_VARREDURA_MAIORES', 10))
+)
+varredura_sessoes.iniciar()
+
+# Token dos endpoints /admin (cabeçalho Authorization: Bearer <token>);
+# sem ele, esses endpoints ficam desativados
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Diário das conversas em disco, gravado em lote em segundo plano. Com
+# CONVERSAS_DIRETORIO vazio, o histórico volta a ficar na própria sessão
+conversas = None
+if os.environ.get('CONVERSAS_DIRETORIO', 'conversas'):
+    conversas = ConversationJournal(
+        os.environ.get('CONVERSAS_DIRETORIO', 'conversas'),
+        tamanho_segmento=int(os.environ.get('CONVERSAS_TAMANHO_SEGMENTO', 64 * 1024 * 1024)),
+        intervalo_gravacao=float(os.environ.get('CONVERSAS_INTERVALO_GRAVACAO', 1.0))
+    )
+    atexit.register(conversas.fechar)
+
+# Detectores de intenção e respostas renderizadas, compartilhados entre o
+# terminal padrão e os demais terminais (TERMINAIS_DIRETORIO)
+compartilhado = SharedStore()
+
+# Base de conhecimento (serviços, horários, intenções e textos das respostas
+# fixas) lida de um arquivo e recarregada sem reiniciar quando ele muda
+base_conhecimento = KnowledgeBase(
+    os.environ.get('BASE_CONHECIMENTO', CAMINHO_BASE_PADRAO),
+    intervalo=float(os.environ.get('BASE_CONHECIMENTO_INTERVALO', 2.0)),
+    compilar=compartilhado.detector
+)
+
+# Padrões de dados pessoais, compilados uma única vez
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+TELEFONE_RE = re.compile(r'(?:\+55\s?)?(?:\(?\d{2}\)?\s?)?(?:9\s?)?\d{4}[-.\s]?\d{4}')
+
+# Parte obrigatória de qualquer telefone: 8 dígitos com separador opcional.
+# O prefixo opcional (+55, DDD, 9) ocupa no máximo 11 caracteres antes dela.
+TELEFONE_NUCLEO_RE = re.compile(r'\d{4}[-.\s]?\d{4}')
+TELEFONE_MAX_PREFIXO = 11
+
+# Tamanho máximo das partes de um e-mail (RFC 5321)
+EMAIL_MAX_LOCAL = 64
+EMAIL_MAX_DOMINIO = 255
+# '@' analisados por mensagem (um e-mail de contato aparece entre os primeiros)
+EMAIL_MAX_ARROBAS = 16
+
+# Só o início da mensagem é analisado (a interface limita mensagens a 500 caracteres)
+LIMITE_ANALISE_PII = 2000
+
+# Todo e-mail tem '@' e todo telefone tem dígitos: mensagens com um deles
+# podem ter dados pessoais e nunca passam pelo cache de respostas
+POSSIVEL_PII_RE = re.compile(r'[@\d]')
+
+# Mensagens mais longas que isto não são guardadas no cache de respostas
+CACHE_MAX_CARACTERES = 200
+
+def buscar_email(texto):
+    """
+    Primeiro e-mail do texto, ou None.
+    
+    Um e-mail tem exatamente um '@', então a regex só roda em uma janela em
+    volta de cada '@', limitada pelos '@' vizinhos e pelo tamanho máximo das
+    partes. As janelas não se sobrepõem e cada uma tem tamanho limitado, o que
+    evita o custo quadrático da regex em textos como 'a@a.a.a.a...'. Só os
+    primeiros EMAIL_MAX_ARROBAS '@' são analisados: com muitos '@' próximos
+    ('a@a.a@a.'), uma busca por '@' custaria mais que a regex no texto todo.
+    """
+    i = texto.find('@')
+    if i == -1 or texto.find('.', i + 1) == -1:
+        return None
+    
+    arrobas = []
+    while i != -1 and len(arrobas) <= EMAIL_MAX_ARROBAS:
+        arrobas.append(i)
+        i = texto.find('@', i + 1)
+    
+    for n, i in enumerate(arrobas[:EMAIL_MAX_ARROBAS]):
+        fim = min(i + 1 + EMAIL_MAX_DOMINIO, arrobas[n + 1] if n + 1 < len(arrobas) else len(texto))
+        if texto.find('.', i + 1, fim) == -1:
+            # Domínio sem ponto: não pode ser e-mail
+            continue
+        inicio = max(i - EMAIL_MAX_LOCAL, arrobas[n - 1] + 1 if n else 0)
+        match = EMAIL_RE.search(texto, inicio, fim)
+        if match:
+            return match.group()
+    return None
+
+def buscar_telefone(texto):
+    """
+    Primeiro telefone do texto, ou None.
+    
+    Procura antes só a parte obrigatória (8 dígitos), que é barata; sem ela
+    não há telefone. Havendo, a regex completa começa logo antes dela, pois
+    nenhum telefone pode começar mais cedo que isso.
+    """
+    nucleo = TELEFONE_NUCLEO_RE.search(texto)
+    if nucleo is None:
+        return None
+    match = TELEFONE_RE.search(texto, max(0, nucleo.start() - TELEFONE_MAX_PREFIXO))
+    return match.group() if match else None
+
+# Nomes das métricas expostas em /metrics
+METRICA_ETAPA = 'chat_etapa_duracao_segundos'
+METRICA_REQUISICAO = 'chat_requisicao_duracao_segundos'
+METRICA_INTENCOES = 'chat_mensagens_total'
+METRICA_CACHE = 'chat_cache_respostas_total'
+METRICA_REJEICOES = 'chat_rejeicoes_total'
 
 class ChatBot:
-    def __init__(self):
-        self.contexto = {}
+    def __init__(self, sessoes=None, metricas=None, conversas=None, base=None, cache=None,
+                 travas=None, compartilhado=None, protocolos=None):
+        self.sessoes = sessoes if sessoes is not None else SessionStore()
+        self.metricas = metricas if metricas is not None else Metricas(ativo=False)
+        # Diário das conversas; sem ele, o histórico fica na sessão
+        self.conversas = conversas
         
-    def detectar_intencao(self, mensagem):
-        """Detecta a intenção do usuário baseado na mensagem"""
-        msg_lower = mensagem.lower()
-        
-        # Palavras-chave para diferentes intenções
-        servicos_keywords = ['serviço', 'servico', 'oferec', 'tem', 'disponível', 'disponivel', 
-                           'fazem', 'faz', 'terminal', 'rodoviária', 'rodoviaria', 'o que']
-        
-        passagem_keywords = ['passagem', 'ônibus', 'onibus', 'viagem', 'viajar', 'destino', 
-                           'horário', 'horario', 'linha', 'empresa', 'comprar']
+        # Serializa as requisições de uma mesma sessão (ler -> processar ->
+        # salvar); ChatBots que usam o mesmo backend de sessões compartilham
+        self.travas = travas if travas is not None else SessionLocks()
         
-        encomenda_keywords = ['encomenda', 'pacote', 'enviar', 'envio', 'entregar', 'entrega',
-                            'receber', 'carga', 'mercadoria']
+        # Cache opcional (ResponseCache) de mensagem normalizada -> resposta
+        self.cache = cache
         
-        guarda_volumes_keywords = ['guarda', 'volume', 'bagagem', 'mala', 'mochila', 'guardar',
-                                  'deixar', 'armário', 'armario']
+        # SharedStore opcional: respostas renderizadas iguais às de outros terminais são reaproveitadas
+        self.compartilhado = compartilhado
         
-        alimentacao_keywords = ['comer', 'comida', 'lanche', 'restaurante', 'café', 'cafe',
-                              'almoço', 'almoco', 'jantar', 'beber']
+        # Números de protocolo únicos entre threads e workers (ProtocolGenerator)
+        self.protocolos = protocolos if protocolos is not None else gerador_padrao()
         
-        horario_keywords = ['horário', 'horario', 'hora', 'quando', 'abre', 'fecha', 
-                          'funcionamento', 'funciona']
-        
-        contato_keywords = ['contato', 'telefone', 'email', 'falar', 'atendente', 'ajuda',
-                          'suporte', 'reclamar', 'reclamação']
+        # Base de conhecimento e respostas fixas renderizadas a partir dela
+        self._estado = None
+        self.aplicar_base(base if base is not None else carregar_base())
+    
+    def aplicar_base(self, base):
+        """
+        Passa a usar outra base de conhecimento. As respostas que não dependem
+        da sessão são renderizadas antes; a troca da base e do catálogo é uma
+        única atribuição, então cada requisição vê um par consistente.
+        """
+        # Toda intenção com texto em "respostas" na base responde com ele (assim
+        # uma intenção nova só precisa de palavras-chave e do texto); as
+        # demais respostas fixas são montadas a partir de serviços e horários
+        geradores = {intencao: partial(self.gerar_resposta_da_base, intencao, base)
+                     for intencao in base.respostas}
+        geradores.update({
+            'servicos_geral': partial(self.gerar_secoes_servicos, base),
+            'passagem': partial(self.gerar_resposta_passagem, base),
+            'encomenda': partial(self.gerar_resposta_encomenda, base),
+            'guarda_volumes': partial(self.gerar_resposta_guarda_volumes, base),
+            'alimentacao': partial(self.gerar_resposta_alimentacao, base),
+            'horario': partial(self.gerar_resposta_horario, base),
+            'outro': self.gerar_resposta_padrao
+        })
+        respostas = ResponseCatalog(geradores, self.compartilhado)
+        anterior, self._estado = self._estado, (base, respostas)
         
-        # Verificar intenções
-        if any(kw in msg_lower for kw in servicos_keywords):
-            return 'servicos_geral'
-        elif any(kw in msg_lower for kw in passagem_keywords):
-            return 'passagem'
-        elif any(kw in msg_lower for kw in encomenda_keywords):
-            return 'encomenda'
-        elif any(kw in msg_lower for kw in guarda_volumes_keywords):
-            return 'guarda_volumes'
-        elif any(kw in msg_lower for kw in alimentacao_keywords):
-            return 'alimentacao'
-        elif any(kw in msg_lower for kw in horario_keywords):
-            return 'horario'
-        elif any(kw in msg_lower for kw in contato_keywords):
-            return 'contato'
-        else:
-            return 'outro'
+        # Respostas em cache vieram da base anterior
+        if anterior is not None and self.cache is not None:
+            self.cache.invalidar()
+    
+    @property
+    def base(self):
+        return self._estado[0]
+    
+    @property
+    def respostas(self):
+        return self._estado[1]
+    
+    def detectar_intencao(self, mensagem, base=None):
+        """Detecta a intenção do usuário baseado na mensagem"""
+        return (base or self.base).detector.detectar(mensagem)
     
     def extrair_dados_pessoais(self, mensagem):
         """Extrai dados pessoais da mensagem se houver"""
         dados = {}
         
-        # Detectar email
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_match = re.search(email_pattern, mensagem)
-        if email_match:
-            dados['email'] = email_match.group()
+        # Mensagens enormes só são analisadas até o limite (tempo limitado)
+        mensagem = mensagem[:LIMITE_ANALISE_PII]
+        
+        # Detectar email (sem '@' não há o que procurar)
+        if '@' in mensagem:
+            email = buscar_email(mensagem)
+            if email:
+                dados['email'] = email
         
         # Detectar telefone (formato brasileiro)
-        telefone_pattern = r'(?:\+55\s?)?(?:\(?\d{2}\)?\s?)?(?:9\s?)?\d{4}[-.\s]?\d{4}'
-        telefone_match = re.search(telefone_pattern, mensagem)
-        if telefone_match:
-            dados['telefone'] = telefone_match.group()
+        telefone = buscar_telefone(mensagem)
+        if telefone:
+            dados['telefone'] = telefone
         
         return dados
     
-    def gerar_resposta_servicos(self):
-        """Gera uma resposta completa sobre os serviços do terminal"""
-        resposta = "🏢 **Bem-vindo ao Terminal Rodoviário!**\n\n"
-        resposta += "Aqui estão nossos principais serviços:\n\n"
+    def gerar_secoes_servicos(self, base=None):
+        """Gera a resposta sobre os serviços em seções (uma por serviço), para streaming"""
+        base = base or self.base
+        yield ("🏢 **Bem-vindo ao Terminal Rodoviário!**\n\n"
+               "Aqui estão nossos principais serviços:\n\n")
         
-        for key, servico in SERVICOS_TERMINAL.items():
-            resposta += f"{servico['titulo']}\n"
-            resposta += f"{servico['descricao']}\n"
+        for key, servico in base.servicos.items():
+            secao = f"{servico['titulo']}\n"
+            secao += f"{servico['descricao']}\n"
             for detalhe in servico['detalhes']:
-                resposta += f"{detalhe}\n"
-            resposta += "\n"
-        
-        resposta += "📍 **Horários de Funcionamento:**\n"
-        for local, horario in HORARIOS_FUNCIONAMENTO.items():
-            resposta += f"• {local.replace('_', ' ').title()}: {horario}\n"
+                secao += f"{detalhe}\n"
+            yield secao + "\n"
         
-        resposta += "\n💬 Posso ajudar com algo específico? Digite:\n"
-        resposta += "• 'passagem' para informações sobre viagens\n"
-        resposta += "• 'encomenda' para envio de pacotes\n"
-        resposta += "• 'guarda volumes' para guardar bagagens\n"
-        resposta += "• 'alimentação' para opções de comida\n"
-        resposta += "• 'contato' para falar com um atendente"
+        secao = "📍 **Horários de Funcionamento:**\n"
+        for local, horario in base.horarios.items():
+            secao += f"• {local.replace('_', ' ').title()}: {horario}\n"
+        yield secao
         
-        return resposta
+        yield ("\n💬 Posso ajudar com algo específico? Digite:\n"
+               "• 'passagem' para informações sobre viagens\n"
+               "• 'encomenda' para envio de pacotes\n"
+               "• 'guarda volumes' para guardar bagagens\n"
+               "• 'alimentação' para opções de comida\n"
+               "• 'contato' para falar com um atendente")
+    
+    def gerar_resposta_servicos(self, base=None):
+        """Gera uma resposta completa sobre os serviços do terminal"""
+        return ''.join(self.gerar_secoes_servicos(base))
+    
+    def gerar_resposta_da_base(self, intencao, base=None):
+        """Texto da intenção em "respostas" na base de conhecimento"""
+        return (base or self.base).respostas[intencao]
     
-    def gerar_resposta_passagem(self):
+    def gerar_resposta_passagem(self, base=None):
         """Gera resposta sobre passagens"""
-        resposta = "🚌 **Informações sobre Passagens**\n\n"
-        resposta += "Trabalhamos com as principais empresas:\n"
-        resposta += "• Viação Cometa\n"
-        resposta += "• Viação Itapemirim\n"
-        resposta += "• Expresso do Sul\n"
-        resposta += "• Águia Branca\n\n"
-        resposta += "**Como comprar:**\n"
-        resposta += "1. Direto no guichê (5h às 23h)\n"
-        resposta += "2. Pelo nosso site (24h)\n"
-        resposta += "3. Pelo telefone: (11) 3333-4444\n\n"
-        resposta += "Para consultar horários e preços, preciso saber:\n"
-        resposta += "• Cidade de destino\n"
-        resposta += "• Data da viagem\n\n"
-        resposta += "Qual destino você procura?"
+        return (base or self.base).respostas['passagem']
+    
+    def gerar_resposta_encomenda(self, base=None):
+        """Gera resposta sobre encomendas"""
+        return (base or self.base).respostas['encomenda']
+    
+    def gerar_resposta_guarda_volumes(self, base=None):
+        """Gera resposta sobre guarda-volumes"""
+        return (base or self.base).respostas['guarda_volumes']
+    
+    def gerar_resposta_alimentacao(self, base=None):
+        """Gera resposta sobre a praça de alimentação"""
+        return (base or self.base).respostas['alimentacao']
+    
+    def gerar_resposta_horario(self, base=None):
+        """Gera resposta com os horários de funcionamento"""
+        resposta = "🕐 **Horários de Funcionamento**\n\n"
+        for local, horario in (base or self.base).horarios.items():
+            resposta += f"**{local.replace('_', ' ').title()}:** {horario}\n"
+        resposta += "\nPrecisa de informações sobre algum serviço específico?"
         
         return resposta
     
-    def gerar_resposta_encomenda(self):
-        """Gera resposta sobre encomendas"""
-        resposta = "📦 **Serviço de Encomendas**\n\n"
-        resposta += "**Para enviar:**\n"
-        resposta += "• Traga o pacote embalado\n"
-        resposta += "• Documento com foto\n"
-        resposta += "• Dados do destinatário\n\n"
-        resposta += "**Tarifas:**\n"
-        resposta += "• Até 5kg: R$ 25,00\n"
-        resposta += "• 5-10kg: R$ 40,00\n"
-        resposta += "• 10-20kg: R$ 60,00\n"
-        resposta += "• Acima de 20kg: consultar\n\n"
-        resposta += "**Prazo de entrega:**\n"
-        resposta += "• Capital: 1-2 dias úteis\n"
-        resposta += "• Interior: 2-4 dias úteis\n"
-        resposta += "• Outros estados: 3-7 dias úteis\n\n"
-        resposta += "Deseja enviar uma encomenda agora?"
+    def gerar_resposta_padrao(self):
+        """Resposta padrão amigável"""
+        resposta = "Olá! Sou o assistente virtual do Terminal Rodoviário. 😊\n\n"
+        resposta += "Posso ajudar com:\n"
+        resposta += "• Informações sobre nossos serviços\n"
+        resposta += "• Compra de passagens\n"
+        resposta += "• Envio de encomendas\n"
+        resposta += "• Guarda-volumes\n"
+        resposta += "• Praça de alimentação\n"
+        resposta += "• Horários de funcionamento\n\n"
+        resposta += "Como posso ajudar você hoje?"
         
         return resposta
     
-    def gerar_resposta_contato(self, session_id):
+    def gerar_resposta_contato(self, contexto):
         """Gera resposta solicitando contato"""
-        if session_id not in self.contexto:
-            self.contexto[session_id] = {}
-        
-        contexto = self.contexto[session_id]
-        
         if 'nome' not in contexto:
             return ("Para conectar você com um atendente, preciso de algumas informações.\n\n"
                    "Por favor, me informe seu **nome completo**:")
@@ -223,135 +334,524 @@ class ChatBot:
             resposta += f"**Nome:** {contexto['nome']}\n"
             resposta += f"**Telefone:** {contexto['telefone']}\n"
             resposta += f"**E-mail:** {contexto['email']}\n\n"
-            resposta += "🎫 **Protocolo:** #" + datetime.now().strftime("%Y%m%d%H%M%S") + "\n\n"
+            resposta += f"🎫 **Protocolo:** #{self.protocolos.gerar()}\n\n"
             resposta += "Um atendente entrará em contato em até 30 minutos.\n"
             resposta += "Horário de atendimento: Segunda a Sexta, 8h às 18h\n\n"
             resposta += "Enquanto isso, posso ajudar com mais alguma informação?"
             
             # Limpar contexto após coletar todos os dados
-            self.contexto[session_id] = {}
+            contexto.clear()
             
             return resposta
     
-    def processar_mensagem(self, mensagem, session_id):
-        """Processa a mensagem e retorna uma resposta apropriada"""
-        if session_id not in self.contexto:
-            self.contexto[session_id] = {}
+    def processar_mensagem(self, mensagem, session_id, sessao=None):
+        """
+        Processa a mensagem e retorna uma resposta apropriada.
+
+        Se `sessao` for informada, quem chamou é responsável por salvá-la;
+        caso contrário a sessão é lida e gravada aqui mesmo.
+        """
+        if sessao is None:
+            with self.travas.de(session_id):
+                sessao = self.sessoes.obter(session_id)
+                try:
+                    return self.processar_mensagem(mensagem, session_id, sessao)
+                finally:
+                    self.sessoes.salvar(session_id, sessao)
+        
+        contexto = sessao.contexto
+        metricas = self.metricas
+        t = metricas.agora()
         
-        contexto = self.contexto[session_id]
+        # Mensagens repetidas, fora da coleta de contato e sem possíveis dados
+        # pessoais, são respondidas direto do cache
+        cache = self.cache
+        chave = None
+        if (cache is not None and not contexto.get('coletando_contato')
+                and len(mensagem) <= CACHE_MAX_CARACTERES and not POSSIVEL_PII_RE.search(mensagem)):
+            # A geração é lida antes da base: se ela mudar durante o cálculo,
+            # o resultado não é guardado
+            geracao = cache.geracao
+            chave = normalizar(mensagem)
+            item = cache.obter(chave)
+            if item is not None:
+                intencao, resposta = item
+                metricas.incrementar(METRICA_CACHE, 'acerto')
+                metricas.incrementar(METRICA_INTENCOES, intencao)
+                metricas.etapa(METRICA_ETAPA, 'consultar_cache', t)
+                return resposta
+            metricas.incrementar(METRICA_CACHE, 'falha')
+            t = metricas.etapa(METRICA_ETAPA, 'consultar_cache', t)
         
         # Extrair dados pessoais se houver
         dados_extraidos = self.extrair_dados_pessoais(mensagem)
+        t = metricas.etapa(METRICA_ETAPA, 'extrair_dados_pessoais', t)
         
         # Se estamos coletando dados para contato
         if 'coletando_contato' in contexto and contexto['coletando_contato']:
-            if 'nome' not in contexto:
-                # Assumir que a mensagem é o nome se não for email ou telefone
-                if not dados_extraidos:
-                    contexto['nome'] = mensagem.strip()
-                    return self.gerar_resposta_contato(session_id)
+            metricas.incrementar(METRICA_INTENCOES, 'coleta_contato')
             
-            if dados_extraidos.get('telefone'):
+            if 'nome' not in contexto and not dados_extraidos:
+                # Assumir que a mensagem é o nome se não for email ou telefone
+                contexto['nome'] = mensagem.strip()
+            elif dados_extraidos.get('telefone'):
                 contexto['telefone'] = dados_extraidos['telefone']
             elif dados_extraidos.get('email'):
                 contexto['email'] = dados_extraidos['email']
             
-            return self.gerar_resposta_contato(session_id)
+            resposta = self.gerar_resposta_contato(contexto)
+            metricas.etapa(METRICA_ETAPA, 'gerar_resposta', t)
+            return resposta
+        
+        # Base e catálogo lidos uma vez: uma recarga no meio da requisição não a afeta
+        base, respostas = self._estado
         
         # Detectar intenção
-        intencao = self.detectar_intencao(mensagem)
+        intencao = self.detectar_intencao(mensagem, base)
+        t = metricas.etapa(METRICA_ETAPA, 'detectar_intencao', t)
+        metricas.incrementar(METRICA_INTENCOES, intencao)
         
-        # Gerar resposta baseada na intenção
-        if intencao == 'servicos_geral':
-            return self.gerar_resposta_servicos()
-        elif intencao == 'passagem':
-            return self.gerar_resposta_passagem()
-        elif intencao == 'encomenda':
-            return self.gerar_resposta_encomenda()
-        elif intencao == 'guarda_volumes':
-            resposta = "🎒 **Guarda-Volumes**\n\n"
-            resposta += "**Tamanhos e preços:**\n"
-            resposta += "• Pequeno (mochila): R$ 10/dia\n"
-            resposta += "• Médio (mala média): R$ 15/dia\n"
-            resposta += "• Grande (mala grande): R$ 20/dia\n\n"
-            resposta += "**Funcionamento:** 6h às 22h\n"
-            resposta += "**Local:** Piso térreo, próximo aos guichês\n\n"
-            resposta += "Deseja guardar algum volume?"
-            return resposta
-        elif intencao == 'alimentacao':
-            resposta = "🍽️ **Praça de Alimentação**\n\n"
-            resposta += "**Opções disponíveis:**\n"
-            resposta += "• McDonald's\n"
-            resposta += "• Subway\n"
-            resposta += "• Restaurante Mineiro\n"
-            resposta += "• Café Expresso\n"
-            resposta += "• Padaria Pão de Açúcar\n\n"
-            resposta += "**Horário:** 6h às 23h\n"
-            resposta += "**Local:** 2º andar\n\n"
-            resposta += "Também temos opções veganas e sem glúten!"
-            return resposta
-        elif intencao == 'horario':
-            resposta = "🕐 **Horários de Funcionamento**\n\n"
-            for local, horario in HORARIOS_FUNCIONAMENTO.items():
-                resposta += f"**{local.replace('_', ' ').title()}:** {horario}\n"
-            resposta += "\nPrecisa de informações sobre algum serviço específico?"
-            return resposta
-        elif intencao == 'contato':
+        if intencao == 'contato':
             contexto['coletando_contato'] = True
-            return self.gerar_resposta_contato(session_id)
+            resposta = self.gerar_resposta_contato(contexto)
         else:
-            # Resposta padrão amigável
-            resposta = "Olá! Sou o assistente virtual do Terminal Rodoviário. 😊\n\n"
-            resposta += "Posso ajudar com:\n"
-            resposta += "• Informações sobre nossos serviços\n"
-            resposta += "• Compra de passagens\n"
-            resposta += "• Envio de encomendas\n"
-            resposta += "• Guarda-volumes\n"
-            resposta += "• Praça de alimentação\n"
-            resposta += "• Horários de funcionamento\n\n"
-            resposta += "Como posso ajudar você hoje?"
-            return resposta
+            # As demais intenções têm respostas fixas, já renderizadas no catálogo
+            resposta = respostas.obter(intencao)
+            if resposta is None:
+                resposta = respostas.obter('outro')
+            if chave is not None:
+                cache.guardar(chave, (intencao, resposta), geracao)
+        
+        metricas.etapa(METRICA_ETAPA, 'gerar_resposta', t)
+        return resposta
+
+    def responder(self, mensagem, session_id):
+        """Processa uma mensagem e registra a troca no diário (ou no histórico da sessão)"""
+        # Requisições simultâneas da mesma sessão esperam a vez; as de
+        # outras sessões seguem em paralelo
+        with self.travas.de(session_id):
+            # Uma leitura e uma gravação da sessão por mensagem
+            sessao = self.sessoes.obter(session_id)
+            
+            # Processar mensagem
+            resposta = self.processar_mensagem(mensagem, session_id, sessao)
+            
+            # Armazenar conversa: no diário só é enfileirada; na sessão o
+            # histórico de cada sessão é limitado
+            t = self.metricas.agora()
+            if self.conversas is not None:
+                self.conversas.registrar(session_id, mensagem, resposta)
+            else:
+                sessao.historico.append({
+                    'timestamp': datetime.now().isoformat(),
+                    'user': mensagem,
+                    'bot': resposta
+                })
+            self.sessoes.salvar(session_id, sessao)
+            self.metricas.etapa(METRICA_ETAPA, 'registrar_conversa', t)
+        
+        return resposta
+    
+    def resetar(self, session_id):
+        """Apaga o contexto e o histórico da sessão"""
+        with self.travas.de(session_id):
+            return self.sessoes.remover(session_id)
+
+# Instrumentação do pipeline do /chat (METRICAS_ATIVAS=0 desliga por completo)
+metricas = Metricas(ativo=os.environ.get('METRICAS_ATIVAS', '1') != '0')
+metricas.registrar_histograma(
+    METRICA_ETAPA, 'Duração de cada etapa do processamento do /chat', 'etapa',
+    ['json_decode', 'consultar_cache', 'extrair_dados_pessoais', 'detectar_intencao', 'gerar_resposta',
+     'registrar_conversa', 'json_encode']
+)
+metricas.registrar_histograma(METRICA_REQUISICAO, 'Duração total do /chat')
+metricas.registrar_contador(
+    METRICA_INTENCOES, 'Mensagens processadas por intenção', 'intencao',
+    [intencao for intencao, _ in base_conhecimento.atual.intencoes] + ['outro', 'coleta_contato']
+)
+metricas.registrar_gauge(
+    'chat_sessoes_ativas', 'Sessões mantidas pelo backend de sessões',
+    lambda: sessoes.metricas()['sessoes_ativas']
+)
+metricas.registrar_gauge(
+    'chat_sessoes_bytes', 'Memória estimada das sessões na última varredura',
+    lambda: (varredura_sessoes.relatorio() or {}).get('bytes', 0)
+)
+if snapshot_sessoes is not None:
+    metricas.registrar_gauge(
+        'chat_sessoes_restauradas', 'Sessões restauradas do snapshot desde o início do processo',
+        lambda: sessoes.metricas()['sessoes_restauradas']
+    )
+
+# Cache das respostas às mensagens mais frequentes (RESPOSTAS_CACHE_MAX=0 desliga)
+cache_respostas = None
+if int(os.environ.get('RESPOSTAS_CACHE_MAX', 1024)) > 0:
+    cache_respostas = ResponseCache(int(os.environ.get('RESPOSTAS_CACHE_MAX', 1024)))
+    metricas.registrar_contador(
+        METRICA_CACHE, 'Consultas ao cache de respostas por resultado', 'resultado', ['acerto', 'falha']
+    )
+    metricas.registrar_gauge(
+        'chat_cache_respostas_itens', 'Mensagens guardadas no cache de respostas',
+        lambda: len(cache_respostas)
+    )
+
+# Números de protocolo: cada processo reserva um worker (de 0 a 1023) no
+# diretório; PROTOCOLO_WORKER_ID fixa o worker em vez de reservar
+protocolos = ProtocolGenerator(
+    int(os.environ['PROTOCOLO_WORKER_ID']) if os.environ.get('PROTOCOLO_WORKER_ID') else None,
+    os.environ.get('PROTOCOLO_DIRETORIO', PROTOCOLO_DIRETORIO_PADRAO)
+)
+
+# Instância global do chatbot (terminal padrão)
+chatbot = ChatBot(sessoes, metricas, conversas, base_conhecimento.atual, cache_respostas,
+                  compartilhado=compartilhado, protocolos=protocolos)
+base_conhecimento.assinar(chatbot.aplicar_base)
+base_conhecimento.monitorar()
 
-# Instância global do chatbot
-chatbot = ChatBot()
+# Outros terminais atendidos pelo mesmo processo, escolhidos pelo campo
+# 'terminal' da requisição ou pelo cabeçalho X-Terminal. Cada um tem a base
+# em TERMINAIS_DIRETORIO/<terminal>.json, carregada no primeiro uso
+TERMINAIS_CACHE_MAX = int(os.environ.get('TERMINAIS_CACHE_MAX', 256))
+
+def criar_chatbot_terminal(terminal_id, base):
+    """ChatBot de um terminal: mesmo backend de sessões, métricas e diário do padrão"""
+    cache = ResponseCache(TERMINAIS_CACHE_MAX) if TERMINAIS_CACHE_MAX > 0 else None
+    bot = ChatBot(sessoes, metricas, conversas, base.atual, cache,
+                  travas=chatbot.travas, compartilhado=compartilhado, protocolos=protocolos)
+    base.assinar(bot.aplicar_base)
+    return bot
+
+terminais = TenantRegistry(
+    os.environ.get('TERMINAIS_DIRETORIO', 'terminais'),
+    criar_chatbot_terminal,
+    compartilhado,
+    max_terminais=int(os.environ.get('TERMINAIS_MAX', 500)),
+    ociosidade=float(os.environ.get('TERMINAIS_OCIOSIDADE_SEGUNDOS', 900)),
+    intervalo=float(os.environ.get('BASE_CONHECIMENTO_INTERVALO', 2.0))
+)
+terminais.monitorar()
+metricas.registrar_gauge(
+    'chat_terminais_carregados', 'Terminais (além do padrão) carregados em memória',
+    lambda: len(terminais)
+)
+
+def resolver_terminal(terminal, session_id):
+    """
+    (ChatBot, chave da sessão no backend) do terminal pedido; sem terminal,
+    o padrão. (None, None) se o terminal não existe.
+    """
+    # O JSON aceita qualquer valor em session_id; no backend a chave é sempre texto
+    session_id = str(session_id)
+    if not terminal:
+        # Chaves do terminal padrão nunca têm a forma '<terminal>:<sessão>':
+        # um session_id com ':' ganha um ':' na frente (os demais ficam como
+        # sempre foram, então as sessões já guardadas continuam valendo)
+        return chatbot, ':' + session_id if ':' in session_id else session_id
+    bot = terminais.obter(terminal)
+    if bot is None:
+        return None, None
+    # Sessões de terminais diferentes não se misturam no backend
+    return bot, f'{terminal}:{session_id}'
+
+def terminal_desconhecido():
+    return jsonify({'status': 'error', 'message': 'Terminal desconhecido'}), 404
+
+# Arquivos de static/ com o hash do conteúdo na URL (/assets/css/style.<hash>.css),
+# cache imutável no navegador e versões gzip/brotli já comprimidas
+assets = StaticAssets(app.static_folder)
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+def url_asset(nome):
+    """URL de um arquivo de static/ para os templates"""
+    # Em modo debug os arquivos podem mudar sem reiniciar: URL sem hash
+    if app.debug:
+        return url_for('static', filename=nome)
+    return app.config['APPLICATION_ROOT'].rstrip('/') + '/assets/' + assets.url(nome)
+
+app.jinja_env.globals['asset'] = url_asset
+
+# A página inicial não depende da requisição: renderizada (e comprimida) uma vez
+pagina_inicial = Variantes(
+    app.jinja_env.get_template('index.html').render().encode('utf-8'),
+    'text/html'
+)
+
+def enviar_variantes(variantes, cache_control):
+    """Conteúdo fixo na melhor codificação aceita pelo cliente, com ETag (304 se não mudou)"""
+    corpo, codificacao, etag = variantes.escolher(request.headers.get('Accept-Encoding', ''))
+    retorno = app.response_class(corpo, mimetype=variantes.tipo)
+    if codificacao:
+        retorno.headers['Content-Encoding'] = codificacao
+    retorno.vary.add('Accept-Encoding')
+    retorno.headers['Cache-Control'] = cache_control
+    retorno.set_etag(etag)
+    return retorno.make_conditional(request)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    if app.debug:
+        return render_template('index.html')
+    # no-cache: o navegador revalida (304 pelo ETag) e pega os assets novos após um deploy
+    return enviar_variantes(pagina_inicial, 'no-cache')
+
+@app.route('/assets/<path:nome>')
+def asset(nome):
+    variantes = assets.obter(nome)
+    if variantes is None:
+        return jsonify({'status': 'error', 'message': 'Arquivo não encontrado'}), 404
+    return enviar_variantes(variantes, CACHE_IMUTAVEL)
+
+# Respostas dinâmicas (JSON do /chat, lotes, métricas) a partir deste tamanho
+# são comprimidas com gzip/brotli, conforme o Accept-Encoding; 0 desativa
+COMPRESSAO_MIN_BYTES = int(os.environ.get('COMPRESSAO_MIN_BYTES', 1024))
+
+@app.after_request
+def comprimir_resposta(retorno):
+    """Comprime respostas grandes; streams (SSE, NDJSON) e arquivos seguem como estão"""
+    if (COMPRESSAO_MIN_BYTES <= 0 or retorno.status_code != 200
+            or retorno.direct_passthrough or retorno.is_streamed
+            or retorno.mimetype not in COMPRIMIVEIS
+            or 'Content-Encoding' in retorno.headers or 'Accept-Encoding' in retorno.vary):
+        return retorno
+    corpo = retorno.get_data()
+    if len(corpo) < COMPRESSAO_MIN_BYTES:
+        return retorno
+    retorno.vary.add('Accept-Encoding')
+    codificacao = escolher_codificacao(request.headers.get('Accept-Encoding', ''))
+    if codificacao:
+        retorno.set_data(comprimir(corpo, codificacao))
+        retorno.headers['Content-Encoding'] = codificacao
+    return retorno
+
+# Processamento em lote: limite de itens e threads que atendem sessões em paralelo
+BATCH_MAX_ITENS = int(os.environ.get('BATCH_MAX_ITENS', 10000))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_MAX_WORKERS', 8)),
+    thread_name_prefix='chat-batch'
+)
+
+# Limites do /chat e do /chat/batch: fichas por sessão e por IP (taxa por segundo e rajada) e
+# requisições em processamento ao mesmo tempo. Taxa ou máximo 0 desliga
+LIMITE_MAX_CHAVES = int(os.environ.get('LIMITE_MAX_CHAVES', 100000))
+limite_sessao = TokenBucketLimiter(
+    float(os.environ.get('LIMITE_SESSAO_TAXA', 5)),
+    float(os.environ.get('LIMITE_SESSAO_RAJADA', 20)),
+    LIMITE_MAX_CHAVES
+)
+limite_ip = TokenBucketLimiter(
+    float(os.environ.get('LIMITE_IP_TAXA', 50)),
+    float(os.environ.get('LIMITE_IP_RAJADA', 200)),
+    LIMITE_MAX_CHAVES
+)
+limite_concorrencia = ConcurrencyLimiter(int(os.environ.get('LIMITE_CONCORRENCIA', 256)))
+
+REJEICOES = {
+    'concorrencia': (503, 'Servidor sobrecarregado, tente novamente em instantes'),
+    'ip': (429, 'Muitas requisições deste endereço, aguarde um pouco'),
+    'sessao': (429, 'Muitas mensagens nesta conversa, aguarde um pouco'),
+}
+metricas.registrar_contador(
+    METRICA_REJEICOES, 'Requisições do /chat recusadas pelos limites', 'motivo', list(REJEICOES)
+)
+
+def rejeicao(motivo, espera):
+    """Resposta (corpo, status, cabeçalhos) da recusa; o cliente deve esperar `espera` segundos"""
+    metricas.incrementar(METRICA_REJEICOES, motivo)
+    status, mensagem = REJEICOES[motivo]
+    corpo = {'status': 'error', 'message': mensagem}
+    return corpo, status, {'Retry-After': str(max(1, math.ceil(espera)))}
 
 @app.route('/chat', methods=['POST'])
 def chat():
+    # Sob sobrecarga ou abuso, recusa antes de ler a sessão (nenhum estado é criado)
+    if not limite_concorrencia.entrar():
+        return rejeicao('concorrencia', 1)
+    try:
+        espera = limite_ip.consumir(request.remote_addr)
+        if espera:
+            return rejeicao('ip', espera)
+        return processar_chat()
+    finally:
+        limite_concorrencia.sair()
+
+def processar_chat():
+    inicio = metricas.agora()
     data = request.json
     mensagem = data.get('message', '')
     session_id = data.get('session_id', 'default')
+    t = metricas.etapa(METRICA_ETAPA, 'json_decode', inicio)
+    
+    bot, chave = resolver_terminal(data.get('terminal') or request.headers.get('X-Terminal'), session_id)
+    if bot is None:
+        return terminal_desconhecido()
+    
+    espera = limite_sessao.consumir(chave)
+    if espera:
+        return rejeicao('sessao', espera)
+    
+    resposta = bot.responder(mensagem, chave)
+    
+    # Clientes que pedem text/event-stream recebem a resposta seção por seção
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        return responder_sse(bot, resposta, session_id, inicio)
+    
+    # Respostas fixas já têm o payload JSON codificado em cache
+    t = metricas.agora()
+    payload = bot.respostas.payload_json(resposta, session_id)
+    if payload is not None:
+        retorno = app.response_class(payload, mimetype='application/json')
+    else:
+        retorno = jsonify({
+            'response': resposta,
+            'session_id': session_id
+        })
+    metricas.etapa(METRICA_ETAPA, 'json_encode', t)
+    metricas.etapa(METRICA_REQUISICAO, None, inicio)
+    
+    return retorno
+
+def responder_sse(bot, resposta, session_id, inicio):
+    """
+    Resposta do /chat como Server-Sent Events: um evento 'section' por seção
+    (na listagem de serviços, um por serviço) e um evento 'done' no final.
+    """
+    eventos = bot.respostas.eventos_sse(resposta)
+    
+    def gerar():
+        yield from eventos
+        yield evento_sse('done', {'session_id': session_id})
+        metricas.etapa(METRICA_REQUISICAO, None, inicio)
     
-    # Processar mensagem
-    resposta = chatbot.processar_mensagem(mensagem, session_id)
+    return Response(gerar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    # Mesmos limites do /chat: a requisição ocupa uma vaga e gasta uma ficha
+    # do IP; cada mensagem gasta uma ficha da sua sessão
+    if not limite_concorrencia.entrar():
+        return rejeicao('concorrencia', 1)
+    try:
+        espera = limite_ip.consumir(request.remote_addr)
+        if espera:
+            return rejeicao('ip', espera)
+        return processar_batch()
+    finally:
+        limite_concorrencia.sair()
+
+def processar_batch():
+    """
+    Processa várias mensagens em uma requisição.
+    
+    Corpo: {"messages": [{"session_id": ..., "message": ...}, ...], "stream": false}
+    
+    As mensagens de uma mesma sessão são processadas na ordem em que vieram;
+    sessões diferentes são processadas em paralelo. Com "stream": true a
+    resposta é NDJSON, uma linha por mensagem assim que ela fica pronta (use
+    o campo "index" para associar à mensagem enviada).
+    """
+    data = request.json
+    itens = data.get('messages') if isinstance(data, dict) else None
+    
+    if not isinstance(itens, list) or not all(isinstance(item, dict) for item in itens):
+        return jsonify({
+            'status': 'error',
+            'message': "Envie 'messages' como uma lista de objetos {session_id, message}"
+        }), 400
+    if len(itens) > BATCH_MAX_ITENS:
+        return jsonify({
+            'status': 'error',
+            'message': f'Lote acima do limite de {BATCH_MAX_ITENS} mensagens'
+        }), 413
+    
+    # Agrupar por sessão (de cada terminal) mantendo a ordem original dentro de cada uma
+    terminal_padrao = request.headers.get('X-Terminal')
+    resultados = queue.Queue()
+    por_sessao = {}
+    for indice, item in enumerate(itens):
+        terminal = item.get('terminal') or terminal_padrao
+        session_id = item.get('session_id', 'default')
+        if terminal is not None and not isinstance(terminal, str):
+            resultados.put({'index': indice, 'session_id': session_id, 'error': 'Terminal desconhecido'})
+            continue
+        # Mesma chave de sessão que resolver_terminal usa (session_id em texto)
+        chave = (terminal, str(session_id))
+        por_sessao.setdefault(chave, []).append((indice, session_id, item.get('message', '')))
     
-    # Armazenar conversa
-    if session_id not in conversations:
-        conversations[session_id] = []
+    def processar_sessao(bot, chave, mensagens):
+        for indice, session_id, mensagem in mensagens:
+            resultado = {'index': indice, 'session_id': session_id}
+            if bot is None:
+                resultado['error'] = 'Terminal desconhecido'
+                resultados.put(resultado)
+                continue
+            try:
+                resultado['response'] = bot.responder(mensagem, chave)
+            except Exception:
+                app.logger.exception('Erro ao processar mensagem do lote (sessão %s)', chave)
+                resultado['error'] = 'Erro ao processar mensagem'
+            resultados.put(resultado)
     
-    conversations[session_id].append({
-        'timestamp': datetime.now().isoformat(),
-        'user': mensagem,
-        'bot': resposta
-    })
+    for (terminal, session_id), mensagens in por_sessao.items():
+        bot, chave = resolver_terminal(terminal, session_id)
+        if bot is not None:
+            aceitas = []
+            for indice, item_session_id, mensagem in mensagens:
+                espera = limite_sessao.consumir(chave)
+                if espera:
+                    # Só a mensagem é recusada; as demais do lote seguem
+                    metricas.incrementar(METRICA_REJEICOES, 'sessao')
+                    resultados.put({'index': indice, 'session_id': item_session_id,
+                                    'error': REJEICOES['sessao'][1], 'retry_after': max(1, math.ceil(espera))})
+                else:
+                    aceitas.append((indice, item_session_id, mensagem))
+            mensagens = aceitas
+        batch_executor.submit(processar_sessao, bot, chave, mensagens)
     
-    return jsonify({
-        'response': resposta,
-        'session_id': session_id
-    })
+    if data.get('stream'):
+        def gerar_linhas():
+            for _ in range(len(itens)):
+                yield json.dumps(resultados.get(), ensure_ascii=False) + '\n'
+        
+        return Response(stream_with_context(gerar_linhas()), mimetype='application/x-ndjson')
+    
+    respostas = [None] * len(itens)
+    for _ in range(len(itens)):
+        resultado = resultados.get()
+        respostas[resultado['index']] = resultado
+    
+    return jsonify({'responses': respostas})
+
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    if not metricas.ativo:
+        return jsonify({'status': 'error', 'message': 'Métricas desativadas'}), 404
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/sessoes')
+def admin_sessoes():
+    """Sessões guardadas, memória estimada e as maiores sessões (?atualizar=1 varre agora)"""
+    if not ADMIN_TOKEN:
+        return jsonify({'status': 'error', 'message': 'Endpoints administrativos desativados'}), 404
+    autorizacao = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(autorizacao, ('Bearer ' + ADMIN_TOKEN).encode('utf-8')):
+        return jsonify({'status': 'error', 'message': 'Não autorizado'}), 401
+
+    relatorio = varredura_sessoes.relatorio()
+    if relatorio is None or request.args.get('atualizar') == '1':
+        relatorio = varredura_sessoes.varrer()
+    return jsonify({'varredura': relatorio, 'backend': sessoes.metricas()})
 
 @app.route('/reset', methods=['POST'])
 def reset():
     data = request.json
     session_id = data.get('session_id', 'default')
     
-    if session_id in conversations:
-        del conversations[session_id]
-    if session_id in chatbot.contexto:
-        del chatbot.contexto[session_id]
+    bot, chave = resolver_terminal(data.get('terminal') or request.headers.get('X-Terminal'), session_id)
+    if bot is None:
+        return terminal_desconhecido()
+    bot.resetar(chave)
     
     return jsonify({'status': 'success', 'message': 'Conversa reiniciada'})
 
@@ -0,0 +1,305 @@
+"""
+Modo de execução assíncrono (ASGI) do chatbot.
+
+Uso:
+    uvicorn asgi:application --workers 4
+
+/chat e /reset são atendidos diretamente aqui: o corpo é lido de forma
+assíncrona e o processamento da mensagem (que pode acessar o SQLite) roda em
+um pool de threads, sem bloquear o event loop. As demais rotas (página
+inicial, /assets, /chat/batch) são repassadas ao app Flask por uma
+ponte WSGI que também roda no pool de threads.
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import (COMPRESSAO_MIN_BYTES, METRICA_ETAPA, METRICA_REQUISICAO, app, limite_concorrencia, limite_ip,
+                 limite_sessao, metricas, rejeicao, resolver_terminal)
+from static_assets import comprimir, escolher_codificacao
+
+executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('ASGI_MAX_WORKERS', 32)),
+    thread_name_prefix='chat-asgi'
+)
+
+_JSON_HEADERS = [(b'content-type', b'application/json')]
+
+# Partes de uma resposta repassada ao Flask geradas antes de serem enviadas
+PARTES_ADIANTADAS = 8
+_FIM = object()
+
+
+async def _ler_corpo(receive):
+    """Lê o corpo completo da requisição"""
+    partes = []
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'http.disconnect':
+            return None
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body', False):
+            return b''.join(partes)
+
+
+async def _enviar(send, status, corpo, headers=_JSON_HEADERS):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers + [(b'content-length', str(len(corpo)).encode('ascii'))]
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+async def _enviar_json(send, status, dados):
+    await _enviar(send, status, (json.dumps(dados) + '\n').encode('ascii'))
+
+
+def _decodificar_json(corpo):
+    """Retorna o objeto JSON do corpo, ou None se não for um objeto válido"""
+    try:
+        data = json.loads(corpo)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _terminal(scope, data):
+    """Terminal pedido no corpo ('terminal') ou no cabeçalho X-Terminal"""
+    if data.get('terminal'):
+        return data['terminal']
+    for nome, valor in scope.get('headers', []):
+        if nome == b'x-terminal':
+            return valor.decode('latin-1')
+    return None
+
+
+def _comprimir(scope, corpo):
+    """(corpo, cabeçalhos) comprimido conforme o Accept-Encoding, como no app Flask"""
+    if COMPRESSAO_MIN_BYTES <= 0 or len(corpo) < COMPRESSAO_MIN_BYTES:
+        return corpo, _JSON_HEADERS
+    aceitas = ''
+    for nome, valor in scope.get('headers', []):
+        if nome == b'accept-encoding':
+            aceitas = valor.decode('latin-1')
+    headers = _JSON_HEADERS + [(b'vary', b'Accept-Encoding')]
+    codificacao = escolher_codificacao(aceitas)
+    if codificacao is None:
+        return corpo, headers
+    return comprimir(corpo, codificacao), headers + [(b'content-encoding', codificacao.encode('ascii'))]
+
+
+async def _enviar_terminal_desconhecido(send):
+    await _enviar_json(send, 404, {'status': 'error', 'message': 'Terminal desconhecido'})
+
+
+async def _enviar_rejeicao(send, motivo, espera):
+    corpo, status, headers = rejeicao(motivo, espera)
+    extras = [(nome.lower().encode('ascii'), valor.encode('ascii')) for nome, valor in headers.items()]
+    await _enviar(send, status, (json.dumps(corpo) + '\n').encode('ascii'), _JSON_HEADERS + extras)
+
+
+async def chat(scope, receive, send):
+    # O streaming SSE fica a cargo do Flask (que aplica os mesmos limites),
+    # repassado em partes pela ponte WSGI
+    for nome, valor in scope.get('headers', []):
+        if nome == b'accept' and b'text/event-stream' in valor:
+            await wsgi(scope, receive, send)
+            return
+
+    # Sob sobrecarga ou abuso, recusa antes de ler o corpo e a sessão
+    if not limite_concorrencia.entrar():
+        await _enviar_rejeicao(send, 'concorrencia', 1)
+        return
+    try:
+        espera = limite_ip.consumir((scope.get('client') or ('',))[0])
+        if espera:
+            await _enviar_rejeicao(send, 'ip', espera)
+            return
+        await _processar_chat(scope, receive, send)
+    finally:
+        limite_concorrencia.sair()
+
+
+async def _processar_chat(scope, receive, send):
+    corpo = await _ler_corpo(receive)
+    if corpo is None:
+        return
+    inicio = metricas.agora()
+    data = _decodificar_json(corpo)
+    if data is None:
+        await _enviar_json(send, 400, {'status': 'error', 'message': 'JSON inválido'})
+        return
+
+    mensagem = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    metricas.etapa(METRICA_ETAPA, 'json_decode', inicio)
+
+    bot, chave = resolver_terminal(_terminal(scope, data), session_id)
+    if bot is None:
+        await _enviar_terminal_desconhecido(send)
+        return
+
+    espera = limite_sessao.consumir(chave)
+    if espera:
+        await _enviar_rejeicao(send, 'sessao', espera)
+        return
+
+    loop = asyncio.get_running_loop()
+    resposta = await loop.run_in_executor(executor, bot.responder, mensagem, chave)
+
+    t = metricas.agora()
+    payload = bot.respostas.payload_json(resposta, session_id)
+    if payload is None:
+        payload = (json.dumps({'response': resposta, 'session_id': session_id}) + '\n').encode('ascii')
+    payload, headers = _comprimir(scope, payload)
+    metricas.etapa(METRICA_ETAPA, 'json_encode', t)
+    metricas.etapa(METRICA_REQUISICAO, None, inicio)
+    await _enviar(send, 200, payload, headers)
+
+
+async def reset(scope, receive, send):
+    corpo = await _ler_corpo(receive)
+    if corpo is None:
+        return
+    data = _decodificar_json(corpo)
+    if data is None:
+        await _enviar_json(send, 400, {'status': 'error', 'message': 'JSON inválido'})
+        return
+
+    bot, chave = resolver_terminal(_terminal(scope, data), data.get('session_id', 'default'))
+    if bot is None:
+        await _enviar_terminal_desconhecido(send)
+        return
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, bot.resetar, chave)
+    await _enviar_json(send, 200, {'status': 'success', 'message': 'Conversa reiniciada'})
+
+
+def _environ_wsgi(scope, corpo):
+    """Monta o environ WSGI equivalente ao scope ASGI"""
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': cliente[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        # O corpo já foi lido inteiro, então o tamanho é conhecido
+        'CONTENT_LENGTH': str(len(corpo)),
+    }
+    for nome, valor in scope.get('headers', []):
+        nome = nome.decode('latin-1').upper().replace('-', '_')
+        valor = valor.decode('latin-1')
+        if nome == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = valor
+        elif nome != 'CONTENT_LENGTH':
+            chave = 'HTTP_' + nome
+            environ[chave] = environ[chave] + ',' + valor if chave in environ else valor
+    return environ
+
+
+async def wsgi(scope, receive, send):
+    """Repassa a requisição ao app Flask, enviando o corpo em partes à medida que é gerado"""
+    corpo = await _ler_corpo(receive)
+    if corpo is None:
+        return
+
+    loop = asyncio.get_running_loop()
+    inicio = {}
+    fila = asyncio.Queue()
+    # O produtor fica no máximo PARTES_ADIANTADAS partes à frente do envio
+    creditos = threading.Semaphore(PARTES_ADIANTADAS)
+    cancelado = threading.Event()
+
+    def start_response(status, headers, exc_info=None):
+        inicio['status'] = int(status.split(' ', 1)[0])
+        inicio['headers'] = [(nome.lower().encode('latin-1'), valor.encode('latin-1'))
+                             for nome, valor in headers]
+
+    def entregar(item):
+        loop.call_soon_threadsafe(fila.put_nowait, item)
+
+    def produzir():
+        # Chamada, iteração e close() na mesma thread: o stream_with_context do
+        # Flask abre o contexto da requisição em uma thread e o fecha na mesma
+        try:
+            resultado = app(_environ_wsgi(scope, corpo), start_response)
+            try:
+                for parte in resultado:
+                    creditos.acquire()
+                    if cancelado.is_set():
+                        break
+                    entregar(parte)
+            finally:
+                if hasattr(resultado, 'close'):
+                    resultado.close()
+        except BaseException as erro:
+            entregar(erro)
+        else:
+            entregar(_FIM)
+
+    async def proximo():
+        item = await fila.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    produtor = loop.run_in_executor(executor, produzir)
+    try:
+        parte = await proximo()
+        await send({'type': 'http.response.start', 'status': inicio['status'], 'headers': inicio['headers']})
+        if parte is _FIM:
+            await send({'type': 'http.response.body', 'body': b''})
+        while parte is not _FIM:
+            seguinte = await proximo()
+            await send({'type': 'http.response.body', 'body': parte, 'more_body': seguinte is not _FIM})
+            creditos.release()
+            parte = seguinte
+    finally:
+        # Cliente desconectado ou erro: o produtor para na próxima parte
+        cancelado.set()
+        creditos.release()
+        await produtor
+
+
+ROTAS = {
+    ('POST', '/chat'): chat,
+    ('POST', '/reset'): reset,
+}
+
+
+async def application(scope, receive, send):
+    """Ponto de entrada ASGI"""
+    if scope['type'] == 'lifespan':
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    rota = ROTAS.get((scope['method'], scope['path']), wsgi)
+    await rota(scope, receive, send)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da detecção de intenção: varredura linear vs detector
+compilado (IntentMatcher).
+
+Também mede o efeito de aumentar o vocabulário: --palavras-extras acrescenta
+palavras-chave sintéticas a cada intenção, como aconteceria ao cadastrar
+novos sinônimos.
+
+Por fim, verifica o orçamento da busca aproximada (erros de digitação): em
+mensagens sem nenhuma palavra-chave exata, incluindo o pior caso (o máximo
+de palavras longas analisadas), o p99 por mensagem precisa ficar abaixo de
+--orcamento-us; caso contrário o script termina com erro.
+
+Uso:
+    python3 benchmark_intencao.py [--mensagens 20000] [--repeticoes 5] [--palavras-extras 0 50 200]
+    python3 benchmark_intencao.py --orcamento-us 50
+"""
+
+import argparse
+import random
+import re
+import time
+
+from intent_matcher import (APROXIMADA_MAX_CARACTERES, APROXIMADA_MAX_LETRAS, APROXIMADA_MAX_PALAVRAS,
+                            APROXIMADA_MIN_LETRAS, IntentMatcher, _distancia_ate_um, normalizar)
+from knowledge_base import carregar_base
+
+PALAVRAS_CHAVE_INTENCOES = carregar_base().intencoes
+
+# Frases reais de atendimento usadas como base do corpus
+FRASES_BASE = [
+    "Eu preciso de saber que serviços vocês tem",
+    "Quero comprar uma passagem de ônibus",
+    "Preciso enviar um pacote para São Paulo",
+    "Que horas o terminal abre?",
+    "Quero falar com um atendente humano",
+    "Onde posso deixar minha mala?",
+    "Tem lugar para comer?",
+    "oi",
+    "bom dia",
+    "João Silva",
+    "11 98765-4321",
+    "joao.silva@email.com",
+    "qual o horário do ônibus para Curitiba amanhã de manhã",
+    "gostaria de informações sobre a cobrança de estacionamento",
+]
+
+PALAVRAS_NEUTRAS = ["por", "favor", "obrigado", "amanhã", "hoje", "cidade", "preciso",
+                    "saber", "gostaria", "informação", "minha", "família", "agora"]
+
+
+def criar_detector_original(intencoes):
+    """
+    Varredura linear da implementação original, com a mesma normalização e a
+    busca aproximada por força bruta (cada palavra contra cada palavra-chave),
+    usada como referência
+    """
+    normalizadas = [(intencao, [normalizar(kw) for kw in palavras]) for intencao, palavras in intencoes]
+
+    def detectar_intencao(mensagem):
+        msg = normalizar(mensagem)
+        for intencao, palavras in normalizadas:
+            if any(kw in msg for kw in palavras):
+                return intencao
+
+        tamanho_ok = lambda p: APROXIMADA_MIN_LETRAS <= len(p) <= APROXIMADA_MAX_LETRAS
+        digitadas = [p for p in re.findall(r'[a-z0-9]+', msg[:APROXIMADA_MAX_CARACTERES]) if tamanho_ok(p)]
+        digitadas = digitadas[:APROXIMADA_MAX_PALAVRAS]
+        for intencao, palavras in normalizadas:
+            if any(tamanho_ok(kw) and kw.isalnum() and _distancia_ate_um(p, kw)
+                   for kw in palavras for p in digitadas):
+                return intencao
+        return 'outro'
+    return detectar_intencao
+
+
+def criar_detector_compilado(intencoes):
+    """Mesmo caminho usado por ChatBot.detectar_intencao"""
+    return IntentMatcher(intencoes).detectar
+
+
+def com_erro_de_digitacao(palavra, rnd):
+    """A palavra com uma letra removida, trocada, inserida ou duas letras invertidas"""
+    i = rnd.randrange(len(palavra) - 1)
+    letra = rnd.choice('abcdefghijklmnopqrstuvwxyz')
+    return rnd.choice([
+        palavra[:i] + palavra[i + 1:],
+        palavra[:i] + letra + palavra[i + 1:],
+        palavra[:i] + letra + palavra[i:],
+        palavra[:i] + palavra[i + 1] + palavra[i] + palavra[i + 2:],
+    ])
+
+
+def gerar_corpus_aproximado(quantidade, semente=43):
+    """
+    Mensagens sem palavra-chave exata: metade com uma palavra-chave digitada
+    errado, metade no pior caso (o máximo de palavras longas, nenhuma delas
+    no vocabulário)
+    """
+    rnd = random.Random(semente)
+    detector = IntentMatcher(PALAVRAS_CHAVE_INTENCOES)
+    longas = [normalizar(kw) for _, palavras in PALAVRAS_CHAVE_INTENCOES for kw in palavras
+              if len(kw) >= APROXIMADA_MIN_LETRAS and kw.isalpha()]
+    letras = 'bcdfghjklmnpqrstvwxz'
+    corpus = []
+    while len(corpus) < quantidade:
+        if rnd.random() < 0.5:
+            mensagem = f"quero {com_erro_de_digitacao(rnd.choice(longas), rnd)} por favor"
+        else:
+            mensagem = ' '.join(''.join(rnd.choice(letras) for _ in range(APROXIMADA_MAX_LETRAS))
+                                for _ in range(APROXIMADA_MAX_PALAVRAS + 4))
+        # Só interessa o caminho da busca aproximada
+        if detector._exata(normalizar(mensagem)) is None:
+            corpus.append(mensagem)
+    return corpus
+
+
+def latencias(funcao, corpus, repeticoes):
+    """Menor tempo de cada mensagem (em microssegundos) entre as repetições"""
+    relogio = time.perf_counter
+    melhores = [float('inf')] * len(corpus)
+    for _ in range(repeticoes):
+        for i, mensagem in enumerate(corpus):
+            inicio = relogio()
+            funcao(mensagem)
+            melhores[i] = min(melhores[i], relogio() - inicio)
+    return sorted(t * 1e6 for t in melhores)
+
+
+def ampliar_vocabulario(intencoes, extras, semente=7):
+    """Acrescenta palavras-chave sintéticas (que não aparecem no corpus) a cada intenção"""
+    rnd = random.Random(semente)
+    letras = 'bcdfghjklmnpqrstvwxz'
+    ampliadas = []
+    for intencao, palavras in intencoes:
+        sinteticas = [''.join(rnd.choice(letras) for _ in range(rnd.randint(5, 9)))
+                      for _ in range(extras)]
+        ampliadas.append((intencao, list(palavras) + sinteticas))
+    return ampliadas
+
+
+def gerar_corpus(quantidade, semente=42):
+    """Gera mensagens sintéticas misturando frases reais, palavras-chave e ruído"""
+    rnd = random.Random(semente)
+    todas_palavras = [kw for _, palavras in PALAVRAS_CHAVE_INTENCOES for kw in palavras]
+    corpus = []
+    for _ in range(quantidade):
+        partes = [rnd.choice(FRASES_BASE)]
+        for _ in range(rnd.randint(0, 12)):
+            partes.append(rnd.choice(PALAVRAS_NEUTRAS))
+        if rnd.random() < 0.5:
+            partes.insert(rnd.randint(0, len(partes)), rnd.choice(todas_palavras).upper())
+        corpus.append(' '.join(partes))
+    return corpus
+
+
+def medir(funcao, corpus, repeticoes):
+    """Retorna o melhor tempo por mensagem (em microssegundos) entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for mensagem in corpus:
+            funcao(mensagem)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mensagens', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--palavras-extras', type=int, nargs='+', default=[0, 50, 200])
+    parser.add_argument('--orcamento-us', type=float, default=50,
+                        help='p99 máximo da busca aproximada por mensagem, em µs')
+    args = parser.parse_args()
+
+    corpus = gerar_corpus(args.mensagens)
+    print(f"Corpus: {len(corpus)} mensagens, {args.repeticoes} repetições (melhor tempo)\n")
+    print(f"{'palavras-chave':>15} {'linear (µs)':>12} {'compilado (µs)':>15} {'ganho':>7}")
+
+    for extras in args.palavras_extras:
+        intencoes = ampliar_vocabulario(PALAVRAS_CHAVE_INTENCOES, extras)
+        original = criar_detector_original(intencoes)
+        compilado = criar_detector_compilado(intencoes)
+
+        # Os dois detectores precisam concordar em todo o corpus
+        divergencias = [m for m in corpus if original(m) != compilado(m)]
+        if divergencias:
+            print(f"❌ {len(divergencias)} divergências, por exemplo: {divergencias[0]!r}")
+            raise SystemExit(1)
+
+        tempo_original = medir(original, corpus, args.repeticoes)
+        tempo_compilado = medir(compilado, corpus, args.repeticoes)
+        total = sum(len(palavras) for _, palavras in intencoes)
+        print(f"{total:>15} {tempo_original:>12.2f} {tempo_compilado:>15.2f} "
+              f"{tempo_original / tempo_compilado:>6.2f}x")
+
+    aproximado = gerar_corpus_aproximado(min(args.mensagens, 5000))
+    detector = IntentMatcher(PALAVRAS_CHAVE_INTENCOES)
+    divergencias = [m for m in aproximado if criar_detector_original(PALAVRAS_CHAVE_INTENCOES)(m) != detector.detectar(m)]
+    if divergencias:
+        print(f"❌ busca aproximada: {len(divergencias)} divergências, por exemplo: {divergencias[0]!r}")
+        raise SystemExit(1)
+    acertos = sum(detector.detectar(m) != 'outro' for m in aproximado)
+    tempos = latencias(detector.detectar, aproximado, args.repeticoes)
+    p50, p99, maximo = tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99)], tempos[-1]
+    print(f"\nBusca aproximada ({len(aproximado)} mensagens sem palavra-chave exata, "
+          f"{acertos} erros de digitação reconhecidos):")
+    print(f"  p50 {p50:.2f} µs  p99 {p99:.2f} µs  máx {maximo:.2f} µs  (orçamento p99: {args.orcamento_us} µs)")
+    if p99 > args.orcamento_us:
+        print("❌ orçamento estourado")
+        raise SystemExit(1)
+    print("✅ dentro do orçamento")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de dados pessoais (e-mail e telefone): regex original
+vs extração com padrões pré-compilados e pré-filtros.
+
+Cobre mensagens típicas e entradas adversárias (sequências longas de dígitos
+e espaços, domínios com muitos pontos, muitos '@'), verificando também que as
+duas implementações extraem os mesmos dados.
+
+Uso:
+    python3 benchmark_pii.py [--repeticoes 5]
+"""
+
+import argparse
+import re
+import time
+
+from app import ChatBot, LIMITE_ANALISE_PII
+
+
+def extrair_dados_pessoais_original(mensagem):
+    """Cópia da implementação original, usada como referência"""
+    dados = {}
+    email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', mensagem)
+    if email_match:
+        dados['email'] = email_match.group()
+    telefone_match = re.search(r'(?:\+55\s?)?(?:\(?\d{2}\)?\s?)?(?:9\s?)?\d{4}[-.\s]?\d{4}', mensagem)
+    if telefone_match:
+        dados['telefone'] = telefone_match.group()
+    return dados
+
+
+TIPICAS = [
+    "oi",
+    "Quero comprar uma passagem de ônibus para Curitiba",
+    "João Silva",
+    "11 98765-4321",
+    "meu telefone é +55 (11) 9 8765-4321, pode ligar depois das 18h",
+    "joao.silva@email.com",
+    "pode mandar para maria_souza+terminal@empresa.com.br por favor",
+    "Preciso enviar um pacote de 5kg para São Paulo amanhã",
+]
+
+
+def adversarias(tamanho):
+    return {
+        'dígitos': "1" * tamanho,
+        'dígitos e espaços': "1 " * (tamanho // 2),
+        'grupos de 3 dígitos': "123 " * (tamanho // 4),
+        'letras sem @': "a" * tamanho,
+        'domínio com pontos': "a@" + "a." * (tamanho // 2),
+        'muitos @': "a@" * (tamanho // 2),
+        '@ e pontos alternados': "a@a." * (tamanho // 4),
+    }
+
+
+def medir(funcao, mensagens, repeticoes):
+    """Melhor tempo médio por mensagem, em microssegundos"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for mensagem in mensagens:
+            funcao(mensagem)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor / len(mensagens) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    bot = ChatBot()
+    cenarios = [('típicas', TIPICAS * 500)]
+    for tamanho in (500, LIMITE_ANALISE_PII, 20000):
+        for nome, mensagem in adversarias(tamanho).items():
+            cenarios.append((f"{nome} ({tamanho} chars)", [mensagem]))
+
+    print(f"{'cenário':<40} {'original (µs)':>14} {'novo (µs)':>11} {'ganho':>8}")
+    for nome, mensagens in cenarios:
+        # Até o limite de análise os resultados precisam ser idênticos
+        for mensagem in mensagens:
+            if len(mensagem) <= LIMITE_ANALISE_PII:
+                esperado = extrair_dados_pessoais_original(mensagem)
+                obtido = bot.extrair_dados_pessoais(mensagem)
+                if esperado != obtido:
+                    print(f"❌ divergência em {nome}: {esperado} != {obtido}")
+                    raise SystemExit(1)
+
+        original = medir(extrair_dados_pessoais_original, mensagens, args.repeticoes)
+        novo = medir(bot.extrair_dados_pessoais, mensagens, args.repeticoes)
+        print(f"{nome:<40} {original:>14.1f} {novo:>11.1f} {original / novo:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Harness de replay e benchmark do chatbot, sem servidor.
+
+Reproduz corpora de conversas (sintéticos ou gravados) diretamente no
+ChatBot e no app Flask via app.test_client(), incluindo fluxos de contato com
+várias mensagens, e mede por cenário: mensagens/s, latência (p50/p90/p99/máx)
+e pico de memória. O resultado pode ser salvo em JSON e comparado com o de
+outro commit.
+
+Uso:
+    python3 benchmark_replay.py                           # cenários sintéticos
+    python3 benchmark_replay.py --corpus conversas.jsonl  # + corpus gravado
+    python3 benchmark_replay.py --saida base.json
+    python3 benchmark_replay.py --comparar base.json --tolerancia 10
+
+Corpus gravado: um JSON por linha com {"session_id": ..., "message": ...},
+na ordem em que as mensagens chegaram.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# O replay mede o pipeline, não os limites de taxa (todas as requisições vêm
+# do mesmo IP e cada sessão manda muitas mensagens por segundo)
+os.environ.setdefault('LIMITE_SESSAO_TAXA', '0')
+os.environ.setdefault('LIMITE_IP_TAXA', '0')
+# Cada execução começa sem as sessões da anterior
+os.environ.setdefault('SESSAO_SNAPSHOT_CAMINHO', '')
+
+from app import ChatBot, app
+from conversation_journal import ConversationJournal
+from response_catalog import ResponseCache
+from session_store import SessionStore
+
+MENSAGENS_AVULSAS = [
+    "Eu preciso de saber que serviços vocês tem",
+    "Quero comprar uma passagem de ônibus",
+    "Preciso enviar um pacote para São Paulo",
+    "Que horas o terminal abre?",
+    "Onde posso deixar minha mala?",
+    "Tem lugar para comer?",
+    "oi",
+    "bom dia",
+    "qual o horário do ônibus para Curitiba amanhã de manhã",
+]
+
+NOMES = ["João Silva", "Maria Souza", "Ana Lima", "Carlos Pereira", "Beatriz Costa"]
+
+
+def corpus_avulsas(quantidade, sessoes=500, semente=1):
+    """Mensagens de uma única troca espalhadas por várias sessões"""
+    rnd = random.Random(semente)
+    return [(f"avulsa_{rnd.randrange(sessoes)}", rnd.choice(MENSAGENS_AVULSAS))
+            for _ in range(quantidade)]
+
+
+def corpus_contato(fluxos, semente=2):
+    """Fluxos completos de contato (4 mensagens cada), intercalados entre sessões"""
+    rnd = random.Random(semente)
+    conversas = []
+    for i in range(fluxos):
+        conversas.append([
+            "Quero falar com um atendente",
+            rnd.choice(NOMES),
+            f"11 9{rnd.randrange(10000):04d}-{rnd.randrange(10000):04d}",
+            f"cliente{i}@email.com",
+        ])
+
+    # Intercala as conversas mantendo a ordem dentro de cada uma
+    corpus = []
+    pendentes = [(f"contato_{i}", conversa) for i, conversa in enumerate(conversas)]
+    while pendentes:
+        indice = rnd.randrange(len(pendentes))
+        session_id, conversa = pendentes[indice]
+        corpus.append((session_id, conversa.pop(0)))
+        if not conversa:
+            pendentes.pop(indice)
+    return corpus
+
+
+def carregar_corpus(caminho):
+    """Lê um corpus gravado em JSONL"""
+    corpus = []
+    with open(caminho, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            if linha.strip():
+                item = json.loads(linha)
+                corpus.append((item.get('session_id', 'default'), item.get('message', '')))
+    return corpus
+
+
+# Executores: recebem o corpus e retornam a latência de cada mensagem
+
+def executar_chatbot(corpus, cache=None):
+    bot = ChatBot(SessionStore(max_sessoes=len(corpus) + 1), cache=cache)
+    latencias = []
+    relogio = time.perf_counter
+    for session_id, mensagem in corpus:
+        inicio = relogio()
+        bot.responder(mensagem, session_id)
+        latencias.append(relogio() - inicio)
+    return latencias
+
+
+def executar_chatbot_cache(corpus):
+    """Como executar_chatbot, com o cache de respostas das mensagens repetidas"""
+    return executar_chatbot(corpus, ResponseCache())
+
+
+def executar_chatbot_diario(corpus):
+    """Como executar_chatbot, mas com as conversas indo para o diário em disco"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        conversas = ConversationJournal(diretorio)
+        bot = ChatBot(SessionStore(max_sessoes=len(corpus) + 1), conversas=conversas)
+        latencias = []
+        relogio = time.perf_counter
+        for session_id, mensagem in corpus:
+            inicio = relogio()
+            bot.responder(mensagem, session_id)
+            latencias.append(relogio() - inicio)
+        conversas.fechar()
+    return latencias
+
+
+def executar_http(corpus):
+    cliente = app.test_client()
+    latencias = []
+    relogio = time.perf_counter
+    for session_id, mensagem in corpus:
+        inicio = relogio()
+        resposta = cliente.post('/chat', json={'message': mensagem, 'session_id': session_id})
+        latencias.append(relogio() - inicio)
+        if resposta.status_code != 200:
+            raise RuntimeError(f"/chat retornou {resposta.status_code}")
+    return latencias
+
+
+def executar_http_lote(corpus, tamanho_lote=500):
+    """Latência por mensagem = tempo do lote dividido pelo número de mensagens"""
+    cliente = app.test_client()
+    latencias = []
+    relogio = time.perf_counter
+    for i in range(0, len(corpus), tamanho_lote):
+        lote = corpus[i:i + tamanho_lote]
+        inicio = relogio()
+        resposta = cliente.post('/chat/batch', json={
+            'messages': [{'session_id': s, 'message': m} for s, m in lote]
+        })
+        decorrido = relogio() - inicio
+        if resposta.status_code != 200:
+            raise RuntimeError(f"/chat/batch retornou {resposta.status_code}")
+        latencias.extend([decorrido / len(lote)] * len(lote))
+    return latencias
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir_cenario(executor, corpus, medir_memoria=True):
+    """Roda o cenário uma vez para tempo e, separadamente, uma vez para memória"""
+    inicio = time.perf_counter()
+    latencias = executor(corpus)
+    decorrido = time.perf_counter() - inicio
+
+    ordenadas = sorted(latencias)
+    resultado = {
+        'mensagens': len(corpus),
+        'msgs_por_s': round(len(corpus) / decorrido, 1),
+        'p50_us': round(percentil(ordenadas, 50) * 1e6, 1),
+        'p90_us': round(percentil(ordenadas, 90) * 1e6, 1),
+        'p99_us': round(percentil(ordenadas, 99) * 1e6, 1),
+        'max_us': round(ordenadas[-1] * 1e6, 1),
+    }
+
+    # tracemalloc deixa tudo mais lento, então a memória é medida em outra rodada
+    if medir_memoria:
+        tracemalloc.start()
+        executor(corpus)
+        resultado['pico_memoria_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    return resultado
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, base, tolerancia):
+    """Imprime a variação por cenário e retorna True se houver regressão acima da tolerância"""
+    regressao = False
+    print(f"\nComparação com {base.get('commit') or 'base'} (tolerância {tolerancia}%):")
+    for nome, resultado in atual['cenarios'].items():
+        anterior = base.get('cenarios', {}).get(nome)
+        if anterior is None:
+            print(f"  {nome:<28} (sem referência)")
+            continue
+        vazao = (resultado['msgs_por_s'] / anterior['msgs_por_s'] - 1) * 100
+        p99 = (resultado['p99_us'] / anterior['p99_us'] - 1) * 100
+        piorou = vazao < -tolerancia or p99 > tolerancia
+        regressao = regressao or piorou
+        print(f"  {nome:<28} vazão {vazao:+6.1f}%  p99 {p99:+6.1f}%  {'❌' if piorou else '✅'}")
+    return regressao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mensagens', type=int, default=20000, help='tamanho do corpus avulso')
+    parser.add_argument('--fluxos', type=int, default=2000, help='fluxos de contato sintéticos')
+    parser.add_argument('--corpus', help='corpus gravado (JSONL) para reproduzir também')
+    parser.add_argument('--sem-memoria', action='store_true', help='não mede pico de memória')
+    parser.add_argument('--saida', help='salva o resultado em JSON neste arquivo')
+    parser.add_argument('--comparar', help='resultado JSON de referência para comparar')
+    parser.add_argument('--tolerancia', type=float, default=10, help='variação aceita, em %%')
+    args = parser.parse_args()
+
+    avulsas = corpus_avulsas(args.mensagens)
+    contato = corpus_contato(args.fluxos)
+    cenarios = [
+        ('chatbot/avulsas', executar_chatbot, avulsas),
+        ('chatbot/fluxo_contato', executar_chatbot, contato),
+        ('chatbot_cache/avulsas', executar_chatbot_cache, avulsas),
+        ('chatbot_diario/avulsas', executar_chatbot_diario, avulsas),
+        ('http/avulsas', executar_http, avulsas),
+        ('http/fluxo_contato', executar_http, contato),
+        ('http_lote/avulsas', executar_http_lote, avulsas),
+    ]
+    if args.corpus:
+        gravado = carregar_corpus(args.corpus)
+        cenarios += [
+            ('chatbot/gravado', executar_chatbot, gravado),
+            ('http/gravado', executar_http, gravado),
+        ]
+
+    resultado = {
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cenarios': {},
+    }
+
+    print(f"{'cenário':<28} {'msgs':>7} {'msgs/s':>10} {'p50 µs':>9} {'p99 µs':>9} "
+          f"{'máx µs':>10} {'pico KB':>9}")
+    for nome, executor, corpus in cenarios:
+        medido = medir_cenario(executor, corpus, not args.sem_memoria)
+        resultado['cenarios'][nome] = medido
+        print(f"{nome:<28} {medido['mensagens']:>7} {medido['msgs_por_s']:>10} "
+              f"{medido['p50_us']:>9} {medido['p99_us']:>9} {medido['max_us']:>10} "
+              f"{medido.get('pico_memoria_kb', '-'):>9}")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"\nResultado salvo em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        if comparar(resultado, base, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Diário (journal) das conversas em disco, só de acréscimo.
+
+As trocas de mensagens são enfileiradas em memória e gravadas em lote por uma
+thread em segundo plano (write-behind), então o /chat só faz um append em uma
+lista. Cada processo grava nos seus próprios segmentos JSONL:
+
+    <diretorio>/conversas-<criação em ms>-<pid>.jsonl.ativo   (em gravação)
+    <diretorio>/conversas-<criação em ms>-<pid>.jsonl         (fechado)
+
+Os textos das respostas são gravados por referência: cada texto distinto
+aparece uma única vez por segmento, em um registro {"t": "r", "h": hash,
+"x": texto}; as trocas guardam só o hash. Assim a listagem de serviços, que
+se repete em milhares de trocas, ocupa espaço uma vez só.
+
+Uso como ferramenta de análise:
+    python3 conversation_journal.py ler conversas/ [--sessao ID]
+    python3 conversation_journal.py compactar conversas/ [--retencao-dias 30]
+"""
+
+import argparse
+import glob
+import hashlib
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from fork_hooks import registrar_apos_fork
+
+SUFIXO_ATIVO = '.ativo'
+
+logger = logging.getLogger(__name__)
+
+
+def hash_texto(texto):
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _linha(registro):
+    return json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class ConversationJournal:
+    """Grava as trocas de mensagens em segmentos de arquivo, em lote"""
+
+    def __init__(self, diretorio, tamanho_segmento=64 * 1024 * 1024, intervalo_gravacao=1.0,
+                 max_pendentes=1000, max_retidos=100000):
+        self.diretorio = diretorio
+        self.tamanho_segmento = tamanho_segmento
+        self.intervalo_gravacao = intervalo_gravacao
+        self.max_pendentes = max_pendentes
+        # Trocas guardadas em memória enquanto a gravação falha (disco cheio,
+        # permissão); acima disso, as mais antigas são descartadas
+        self.max_retidos = max_retidos
+        os.makedirs(diretorio, exist_ok=True)
+
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+
+        # Estado do segmento atual, protegido por _gravacao
+        self._gravacao = threading.Lock()
+        self._arquivo = None
+        self._caminho = None
+        self._tamanho = 0
+        self._hashes_no_segmento = set()
+        self._cache_hash = {}
+
+        self.registros_gravados = 0
+        self.segmentos_fechados = 0
+        self.falhas = 0
+        self.descartados = 0
+
+        self._pid = os.getpid()
+        self._iniciar_thread()
+        # Após um fork, cada filho inicia a sua thread e grava nos seus próprios segmentos
+        registrar_apos_fork(self)
+
+    def _iniciar_thread(self):
+        self._thread = threading.Thread(target=self._executar, name='conversation-journal', daemon=True)
+        self._thread.start()
+
+    def _apos_fork(self):
+        self._lock = threading.Lock()
+        self._gravacao = threading.Lock()
+        self._acordar = threading.Event()
+        self._pendentes = []
+        self._arquivo = None
+        # Um diário já fechado no pai continua fechado no filho
+        if not self._parar:
+            self._iniciar_thread()
+
+    # Caminho quente
+
+    def registrar(self, session_id, mensagem, resposta, timestamp=None):
+        """Enfileira uma troca; a gravação acontece em segundo plano"""
+        registro = (session_id, time.time() if timestamp is None else timestamp, mensagem, resposta)
+        with self._lock:
+            self._pendentes.append(registro)
+            cheio = len(self._pendentes) >= self.max_pendentes
+        if cheio:
+            self._acordar.set()
+
+    # Thread de gravação
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(self.intervalo_gravacao)
+            self._acordar.clear()
+            if not self.descarregar() and not self._parar:
+                # Após uma falha, espera o intervalo antes de tentar de novo
+                time.sleep(self.intervalo_gravacao)
+            if self._parar:
+                return
+
+    def descarregar(self):
+        """
+        Grava tudo o que está pendente (também chamado ao encerrar). Se a
+        gravação falha, o lote volta para a fila e é tentado de novo na
+        próxima vez; retorna False nesse caso.
+        """
+        with self._gravacao:
+            with self._lock:
+                pendentes, self._pendentes = self._pendentes, []
+            if not pendentes:
+                return True
+            try:
+                self._gravar(pendentes)
+            except (OSError, ValueError) as erro:
+                self.falhas += 1
+                logger.warning("Diário de conversas não gravado (%s): %s", self.diretorio, erro)
+                # O segmento pode ter ficado com uma linha incompleta (ignorada
+                # na leitura); a próxima gravação começa um segmento novo
+                if self._arquivo is not None:
+                    self._fechar_segmento()
+                with self._lock:
+                    # O lote fica à frente das trocas que chegaram enquanto isso
+                    self._pendentes[:0] = pendentes
+                    excesso = len(self._pendentes) - self.max_retidos
+                    if excesso > 0:
+                        del self._pendentes[:excesso]
+                        self.descartados += excesso
+                return False
+            return True
+
+    def _gravar(self, pendentes):
+        if self._arquivo is None:
+            self._abrir_segmento()
+
+        partes = []
+        for session_id, timestamp, mensagem, resposta in pendentes:
+            h = self._hash(resposta)
+            if h not in self._hashes_no_segmento:
+                self._hashes_no_segmento.add(h)
+                partes.append(_linha({'t': 'r', 'h': h, 'x': resposta}))
+            partes.append(_linha({'t': 'm', 's': session_id, 'ts': round(timestamp, 3),
+                                  'u': mensagem, 'h': h}))
+
+        dados = ''.join(partes).encode('utf-8')
+        self._arquivo.write(dados)
+        self._arquivo.flush()
+        self._tamanho += len(dados)
+        self.registros_gravados += len(pendentes)
+
+        if self._tamanho >= self.tamanho_segmento:
+            self._fechar_segmento()
+
+    def _hash(self, texto):
+        # As respostas fixas são sempre o mesmo objeto str, então a consulta é barata
+        h = self._cache_hash.get(texto)
+        if h is None:
+            if len(self._cache_hash) >= 4096:
+                self._cache_hash.clear()
+            h = self._cache_hash[texto] = hash_texto(texto)
+        return h
+
+    def _abrir_segmento(self):
+        self._pid = os.getpid()
+        nome = f"conversas-{int(time.time() * 1000):013d}-{self._pid}.jsonl"
+        self._caminho = os.path.join(self.diretorio, nome)
+        self._arquivo = open(self._caminho + SUFIXO_ATIVO, 'ab')
+        self._tamanho = 0
+        self._hashes_no_segmento = set()
+
+    def _fechar_segmento(self):
+        """Fecha o segmento atual e o marca como pronto para leitura e compactação"""
+        try:
+            self._arquivo.close()
+            os.replace(self._caminho + SUFIXO_ATIVO, self._caminho)
+            self.segmentos_fechados += 1
+        except OSError as erro:
+            logger.warning("Segmento do diário não fechado (%s): %s", self._caminho, erro)
+        self._arquivo = None
+
+    def fechar(self):
+        """Grava o que estiver pendente e fecha o segmento atual"""
+        self._parar = True
+        self._acordar.set()
+        self._thread.join()
+        with self._gravacao:
+            if self._arquivo is not None:
+                self._fechar_segmento()
+
+
+def listar_segmentos(diretorio, incluir_ativos=True):
+    padroes = ['conversas-*.jsonl'] + (['conversas-*.jsonl' + SUFIXO_ATIVO] if incluir_ativos else [])
+    caminhos = []
+    for padrao in padroes:
+        caminhos.extend(glob.glob(os.path.join(diretorio, padrao)))
+    return sorted(caminhos)
+
+
+def _ler_segmento(caminho, session_id=None):
+    """Trocas de um segmento, na ordem gravada, com o texto da resposta resolvido"""
+    respostas = {}
+    with open(caminho, 'rb') as arquivo:
+        for linha in arquivo:
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                # Última linha incompleta (processo interrompido no meio da gravação)
+                continue
+            if registro['t'] == 'r':
+                respostas[registro['h']] = registro['x']
+            elif session_id is None or registro['s'] == session_id:
+                yield {
+                    'session_id': registro['s'],
+                    'timestamp': registro['ts'],
+                    'user': registro['u'],
+                    'bot': respostas.get(registro['h']),
+                }
+
+
+def ler_conversas(diretorio, session_id=None):
+    """
+    Todas as trocas gravadas, em ordem de horário, como um gerador.
+
+    Os segmentos são lidos em paralelo e intercalados pelo horário, com uma
+    troca por segmento em memória; só os textos distintos das respostas de
+    cada segmento ficam em um dicionário. Uma sessão nunca é carregada inteira.
+    """
+    leitores = [_ler_segmento(caminho, session_id) for caminho in listar_segmentos(diretorio)]
+    return heapq.merge(*leitores, key=lambda troca: troca['timestamp'])
+
+
+def compactar(diretorio, retencao=None, tamanho_segmento=64 * 1024 * 1024):
+    """
+    Junta os segmentos fechados em segmentos maiores, descartando trocas mais
+    antigas que `retencao` segundos e textos de resposta que não são mais
+    usados. Retorna (segmentos lidos, segmentos gerados).
+    """
+    fechados = listar_segmentos(diretorio, incluir_ativos=False)
+    if len(fechados) < 2 and retencao is None:
+        return len(fechados), len(fechados)
+
+    limite = time.time() - retencao if retencao is not None else None
+    gerados = []
+    arquivo = None
+    tamanho = 0
+    hashes = set()
+
+    def novo_segmento():
+        nonlocal arquivo, tamanho, hashes
+        if arquivo is not None:
+            arquivo.close()
+        caminho = os.path.join(diretorio, f"conversas-{int(time.time() * 1000):013d}-compactado{len(gerados)}.jsonl")
+        gerados.append(caminho)
+        arquivo = open(caminho + '.tmp', 'wb')
+        tamanho = 0
+        hashes = set()
+
+    for troca in heapq.merge(*(_ler_segmento(c) for c in fechados), key=lambda t: t['timestamp']):
+        if limite is not None and troca['timestamp'] < limite:
+            continue
+        if arquivo is None or tamanho >= tamanho_segmento:
+            novo_segmento()
+
+        texto = troca['bot'] or ''
+        h = hash_texto(texto)
+        partes = []
+        if h not in hashes:
+            hashes.add(h)
+            partes.append(_linha({'t': 'r', 'h': h, 'x': texto}))
+        partes.append(_linha({'t': 'm', 's': troca['session_id'], 'ts': troca['timestamp'],
+                              'u': troca['user'], 'h': h}))
+        dados = ''.join(partes).encode('utf-8')
+        arquivo.write(dados)
+        tamanho += len(dados)
+
+    if arquivo is not None:
+        arquivo.close()
+
+    # Publica os novos segmentos antes de apagar os antigos
+    for caminho in gerados:
+        os.replace(caminho + '.tmp', caminho)
+    for caminho in fechados:
+        if caminho not in gerados:
+            os.remove(caminho)
+
+    return len(fechados), len(gerados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leitura e compactação do diário de conversas")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    ler = sub.add_parser('ler', help='imprime as trocas em JSONL, em ordem de horário')
+    ler.add_argument('diretorio')
+    ler.add_argument('--sessao', help='só as trocas desta sessão')
+
+    comp = sub.add_parser('compactar', help='junta segmentos fechados e aplica retenção')
+    comp.add_argument('diretorio')
+    comp.add_argument('--retencao-dias', type=float, help='descarta trocas mais antigas')
+
+    args = parser.parse_args()
+
+    if args.comando == 'ler':
+        for troca in ler_conversas(args.diretorio, args.sessao):
+            sys.stdout.write(json.dumps(troca, ensure_ascii=False) + '\n')
+    else:
+        retencao = args.retencao_dias * 86400 if args.retencao_dias is not None else None
+        lidos, gerados = compactar(args.diretorio, retencao)
+        print(f"{lidos} segmentos compactados em {gerados}")
+
+
+if __name__ == "__main__":
+    main()
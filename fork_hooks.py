@@ -0,0 +1,28 @@
+"""
+Reinicialização do estado de um objeto no processo filho após um fork.
+
+Servidores que fazem fork dos workers (gunicorn com --preload, por exemplo)
+copiam a memória do pai para o filho, mas não as threads: uma thread em
+segundo plano não existe no filho, um lock pode ter sido copiado fechado e
+um arquivo reservado com lock pertence ao pai. Quem guarda esse tipo de
+estado implementa _apos_fork() e chama registrar_apos_fork(self) uma vez.
+"""
+
+import os
+import weakref
+from functools import partial
+
+
+def _apos_fork(referencia):
+    objeto = referencia()
+    if objeto is not None:
+        objeto._apos_fork()
+
+
+def registrar_apos_fork(objeto):
+    """
+    Chama objeto._apos_fork() no processo filho a cada fork. A referência é
+    fraca: o registro não impede que o objeto seja descartado.
+    """
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=partial(_apos_fork, weakref.ref(objeto)))
@@ -0,0 +1,183 @@
+"""
+Detector de intenção compilado uma única vez na inicialização.
+
+Mensagem e palavras-chave passam pela mesma normalização (sem acentos, em
+minúsculas), então 'horário' e 'horario' são a mesma palavra-chave.
+
+Todas as palavras-chave de todas as intenções viram uma única regex em forma
+de trie (prefixos comuns fatorados), então o motor de regex avança pela
+mensagem testando só os ramos que começam com o caractere atual. Cada busca
+recomeça logo depois do início do último acerto, de modo que nenhuma
+palavra-chave é "escondida" por outra que se sobreponha a ela.
+
+Se nenhuma palavra-chave aparece, as palavras da mensagem são comparadas com
+o vocabulário tolerando um erro de digitação (uma letra a mais, a menos,
+trocada ou duas letras invertidas: 'pasagem', 'encomeda'). A comparação usa
+um índice pré-calculado por tamanho e pelas duas primeiras e duas últimas
+letras, com custo limitado por mensagem.
+"""
+
+import re
+import unicodedata
+
+# Busca aproximada: só palavras com pelo menos este tamanho (em palavras
+# curtas um erro de digitação vira outra palavra) e no máximo este número de
+# palavras por mensagem, o que limita o custo no pior caso
+APROXIMADA_MIN_LETRAS = 5
+APROXIMADA_MAX_LETRAS = 20
+APROXIMADA_MAX_PALAVRAS = 8
+APROXIMADA_MAX_CARACTERES = 200
+
+_PALAVRA_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalizar(texto):
+    """Texto sem acentos e em minúsculas ('Horário' -> 'horario')"""
+    if texto.isascii():
+        return texto.lower()
+    # Decompõe os caracteres acentuados e descarta as marcas (e o que não é latino)
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def _distancia_ate_um(a, b):
+    """True se a e b diferem por no máximo uma edição (inserção, remoção, troca ou inversão)"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    # Pula o prefixo comum e compara o resto
+    i = 0
+    while i < la and i < lb and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return (a[i + 1:] == b[i + 1:] or
+                (i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]))
+    if la > lb:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+def _trie_para_regex(no):
+    """Converte um nó da trie ({char: filho, '': True se termina}) em regex"""
+    termina = '' in no
+    ramos = [re.escape(char) + _trie_para_regex(filho)
+             for char, filho in sorted(no.items()) if char != '']
+
+    if not ramos:
+        return ''
+
+    if len(ramos) == 1:
+        corpo = ramos[0]
+        if termina:
+            # Sufixo opcional guloso: sempre tenta a palavra mais longa primeiro
+            return f'(?:{corpo})?' if len(corpo) > 1 else corpo + '?'
+        return corpo
+
+    corpo = '(?:' + '|'.join(ramos) + ')'
+    return corpo + '?' if termina else corpo
+
+
+class IntentMatcher:
+    """Resolve a intenção de uma mensagem em uma única passada"""
+
+    def __init__(self, intencoes, padrao='outro'):
+        """
+        intencoes: sequência ordenada de (intencao, palavras_chave). A ordem
+        define a prioridade: a primeira intenção com alguma palavra-chave
+        presente na mensagem vence.
+        """
+        self.intencoes = tuple((nome, tuple(palavras)) for nome, palavras in intencoes)
+        self.padrao = padrao
+
+        # Prioridade de cada palavra-chave normalizada (a menor, se ela
+        # aparece em mais de uma intenção ou com e sem acento)
+        prioridade = {}
+        for i, (_, palavras) in enumerate(self.intencoes):
+            for palavra in palavras:
+                palavra = normalizar(palavra)
+                if palavra and palavra not in prioridade:
+                    prioridade[palavra] = i
+
+        # Em cada posição a regex devolve a palavra-chave mais longa que começa
+        # ali; todas as outras que também começam ali são prefixos dela. Por
+        # isso cada palavra guarda a melhor prioridade entre seus prefixos.
+        self._melhor_por_palavra = {
+            palavra: min(p for outra, p in prioridade.items() if palavra.startswith(outra))
+            for palavra in prioridade
+        }
+
+        trie = {}
+        for palavra in prioridade:
+            no = trie
+            for char in palavra:
+                no = no.setdefault(char, {})
+            no[''] = True
+
+        self._regex = re.compile(_trie_para_regex(trie)) if trie else None
+
+        # Índices da busca aproximada: duas primeiras (ou duas últimas) letras
+        # -> palavras-chave. Com pelo menos 5 letras, uma única edição não
+        # alcança ao mesmo tempo as duas primeiras e as duas últimas letras,
+        # então toda palavra-chave a uma edição da palavra digitada está em
+        # um dos dois índices (e tem tamanho diferente em no máximo 1).
+        self._por_inicio = {}
+        self._por_fim = {}
+        for palavra, indice in prioridade.items():
+            if APROXIMADA_MIN_LETRAS <= len(palavra) <= APROXIMADA_MAX_LETRAS and palavra.isalnum():
+                item = (palavra, len(palavra), indice)
+                self._por_inicio.setdefault(palavra[:2], []).append(item)
+                self._por_fim.setdefault(palavra[-2:], []).append(item)
+
+    def detectar(self, mensagem):
+        """Retorna a intenção de maior prioridade encontrada na mensagem"""
+        if self._regex is None:
+            return self.padrao
+
+        msg = normalizar(mensagem)
+        melhor = self._exata(msg)
+        if melhor is None:
+            melhor = self._aproximada(msg)
+
+        if melhor is None:
+            return self.padrao
+        return self.intencoes[melhor][0]
+
+    def _exata(self, msg):
+        """Índice da intenção de maior prioridade com palavra-chave presente em msg"""
+        buscar = self._regex.search
+        melhor_por_palavra = self._melhor_por_palavra
+        melhor = len(self.intencoes)
+
+        match = buscar(msg)
+        while match:
+            indice = melhor_por_palavra[match.group()]
+            if indice < melhor:
+                melhor = indice
+                if melhor == 0:
+                    break
+            match = buscar(msg, match.start() + 1)
+
+        return None if melhor == len(self.intencoes) else melhor
+
+    def _aproximada(self, msg):
+        """Como _exata, mas tolerando um erro de digitação por palavra"""
+        por_inicio, por_fim = self._por_inicio, self._por_fim
+        melhor = None
+        analisadas = 0
+        for palavra in _PALAVRA_RE.findall(msg, 0, APROXIMADA_MAX_CARACTERES):
+            tamanho = len(palavra)
+            if not APROXIMADA_MIN_LETRAS <= tamanho <= APROXIMADA_MAX_LETRAS:
+                continue
+            analisadas += 1
+            if analisadas > APROXIMADA_MAX_PALAVRAS:
+                break
+
+            for grupo in (por_inicio.get(palavra[:2]), por_fim.get(palavra[-2:])):
+                if grupo is None:
+                    continue
+                for candidata, tamanho_candidata, indice in grupo:
+                    if (-1 <= tamanho - tamanho_candidata <= 1 and (melhor is None or indice < melhor)
+                            and _distancia_ate_um(palavra, candidata)):
+                        melhor = indice
+        return melhor
@@ -0,0 +1,186 @@
+"""
+Base de conhecimento do terminal (serviços, horários, intenções e textos das
+respostas fixas), lida de um arquivo JSON ou YAML.
+
+Cada carga gera um retrato imutável (Conhecimento) com os índices de consulta
+e o detector de intenção já compilados. KnowledgeBase observa o arquivo e,
+quando ele muda, monta o novo retrato em segundo plano e só então troca a
+referência: as requisições em andamento continuam com o retrato que já
+tinham e nenhuma delas espera pela recarga.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+from fork_hooks import registrar_apos_fork
+from intent_matcher import IntentMatcher
+
+try:
+    import yaml
+except ImportError:  # PyYAML é opcional; só é preciso para arquivos .yaml
+    yaml = None
+
+CAMINHO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_conhecimento.json')
+
+logger = logging.getLogger(__name__)
+
+
+def _congelar(valor):
+    """
+    Cópia somente leitura de dicionários e listas aninhados. Os textos são
+    internados, então bases de terminais diferentes compartilham os iguais.
+    """
+    if isinstance(valor, dict):
+        return MappingProxyType({sys.intern(chave): _congelar(item) for chave, item in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(item) for item in valor)
+    if isinstance(valor, str):
+        return sys.intern(valor)
+    return valor
+
+
+class Conhecimento:
+    """Retrato imutável da base de conhecimento, com índices prontos"""
+
+    __slots__ = ('servicos', 'horarios', 'intencoes', 'respostas', 'detector', 'versao')
+
+    def __init__(self, dados, versao=1, anterior=None, compilar=IntentMatcher):
+        """
+        compilar: função (intencoes) -> detector; um SharedStore pode devolver
+        o mesmo detector para bases com as mesmas intenções.
+        """
+        try:
+            servicos = dados['servicos']
+            horarios = dados['horarios']
+            intencoes = [(item['intencao'], list(item['palavras_chave'])) for item in dados['intencoes']]
+            respostas = {intencao: '\n'.join(linhas) for intencao, linhas in dados.get('respostas', {}).items()}
+        except (KeyError, TypeError) as erro:
+            raise ValueError(f"base de conhecimento inválida: {erro!r}") from erro
+
+        for chave, servico in servicos.items():
+            if servico.get('horario') is not None and servico['horario'] not in horarios:
+                raise ValueError(f"serviço '{chave}' usa o horário inexistente '{servico['horario']}'")
+
+        # Compilar o detector é a parte mais cara da carga (e segura o GIL);
+        # se as palavras-chave não mudaram, o do retrato anterior serve
+        intencoes = tuple((intencao, tuple(palavras)) for intencao, palavras in intencoes)
+        if anterior is not None and anterior.intencoes == intencoes:
+            detector = anterior.detector
+        else:
+            detector = compilar(intencoes)
+
+        # object.__setattr__ porque __setattr__ bloqueia alterações depois de pronto
+        definir = object.__setattr__
+        definir(self, 'servicos', _congelar(servicos))
+        definir(self, 'horarios', _congelar(horarios))
+        definir(self, 'intencoes', intencoes)
+        definir(self, 'respostas', MappingProxyType(respostas))
+        definir(self, 'detector', detector)
+        definir(self, 'versao', versao)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("Conhecimento é imutável; recarregue a base para alterá-la")
+
+
+def ler_arquivo(caminho):
+    """Dados brutos do arquivo (JSON, ou YAML se a extensão for .yaml/.yml)"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        if caminho.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("instale o PyYAML para usar uma base de conhecimento em YAML")
+            return yaml.safe_load(arquivo)
+        return json.load(arquivo)
+
+
+def carregar_base(caminho=CAMINHO_PADRAO, versao=1, anterior=None, compilar=IntentMatcher):
+    """Lê o arquivo e monta o retrato (ValueError/OSError se não for possível)"""
+    return Conhecimento(ler_arquivo(caminho), versao, anterior, compilar)
+
+
+class KnowledgeBase:
+    """Mantém o retrato atual da base e o recarrega quando o arquivo muda"""
+
+    def __init__(self, caminho=CAMINHO_PADRAO, intervalo=2.0, compilar=IntentMatcher):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self._compilar = compilar
+        self._assinantes = []
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.recargas = 0
+        self.falhas = 0
+
+        self._assinatura = self._assinatura_arquivo()
+        self.atual = carregar_base(caminho, compilar=compilar)
+
+    def _assinatura_arquivo(self):
+        try:
+            estado = os.stat(self.caminho)
+        except OSError:
+            return None
+        return estado.st_mtime_ns, estado.st_size, estado.st_ino
+
+    def assinar(self, funcao):
+        """funcao(conhecimento) é chamada a cada novo retrato, antes de ele virar o atual"""
+        self._assinantes.append(funcao)
+
+    def recarregar(self, forcar=False):
+        """
+        Recarrega a base se o arquivo mudou (ou sempre, com forcar=True).
+        Retorna True se um novo retrato foi publicado. Um arquivo inválido é
+        ignorado e o retrato anterior continua valendo.
+        """
+        with self._lock:
+            assinatura = self._assinatura_arquivo()
+            if not forcar and assinatura == self._assinatura:
+                return False
+            self._assinatura = assinatura
+
+            try:
+                # Entre uma etapa e outra o GIL é liberado (sleep(0)), para
+                # que as requisições não esperem a recarga inteira
+                dados = ler_arquivo(self.caminho)
+                time.sleep(0)
+                novo = Conhecimento(dados, self.atual.versao + 1, self.atual, self._compilar)
+                # Os assinantes preparam o que depende da base (ex.: respostas
+                # renderizadas) antes da troca, fora do caminho das requisições
+                for funcao in self._assinantes:
+                    time.sleep(0)
+                    funcao(novo)
+            except (OSError, ValueError, KeyError, TypeError) as erro:
+                self.falhas += 1
+                logger.warning("Base de conhecimento não recarregada (%s): %s", self.caminho, erro)
+                return False
+
+            self.atual = novo
+            self.recargas += 1
+            return True
+
+    # Observação do arquivo
+
+    def monitorar(self):
+        """Verifica o arquivo a cada `intervalo` segundos, em uma thread em segundo plano"""
+        if self._thread is not None or self.intervalo <= 0:
+            return
+        self._thread = threading.Thread(target=self._executar, name='knowledge-base', daemon=True)
+        self._thread.start()
+        # Após um fork, cada filho inicia a sua thread
+        registrar_apos_fork(self)
+
+    def _apos_fork(self):
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._executar, name='knowledge-base', daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.recarregar()
+
+    def parar(self):
+        self._parar.set()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do /chat: vazão e latência (p50/p99) com N conexões simultâneas.
+
+Compare o servidor WSGI atual com o modo ASGI rodando os dois e apontando o
+script para cada um:
+
+    python3 app.py                                   # WSGI (porta 5000)
+    uvicorn asgi:application --port 8000 --workers 4 # ASGI
+
+Todas as conexões saem do mesmo IP: para medir vazão, e não os limites de
+taxa, suba o servidor com LIMITE_IP_TAXA=0 LIMITE_SESSAO_TAXA=0 (as
+respostas 429/503 aparecem em "Erros").
+
+    python3 loadtest.py --url http://localhost:5000 --conexoes 1000
+    python3 loadtest.py --url http://localhost:8000 --conexoes 1000
+
+Usa apenas a biblioteca padrão. Com 1000 conexões pode ser preciso aumentar o
+limite de arquivos abertos (ulimit -n 4096).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+MENSAGENS = [
+    "Eu preciso de saber que serviços vocês tem",
+    "Quero comprar uma passagem de ônibus",
+    "Preciso enviar um pacote para São Paulo",
+    "Que horas o terminal abre?",
+    "Tem lugar para comer?",
+    "oi",
+]
+
+
+class Cliente:
+    """Uma conexão HTTP/1.1 que reaproveita o socket quando o servidor permite"""
+
+    def __init__(self, host, porta):
+        self.host = host
+        self.porta = porta
+        self.leitor = None
+        self.escritor = None
+
+    async def _conectar(self):
+        self.leitor, self.escritor = await asyncio.open_connection(self.host, self.porta)
+
+    async def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            try:
+                await self.escritor.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.escritor = None
+
+    async def post(self, caminho, dados):
+        """Envia um POST JSON e retorna o status HTTP"""
+        if self.escritor is None:
+            await self._conectar()
+
+        corpo = json.dumps(dados).encode('utf-8')
+        self.escritor.write(
+            f"POST {caminho} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n"
+            f"Connection: keep-alive\r\n\r\n".encode('ascii') + corpo
+        )
+        await self.escritor.drain()
+
+        linha_status = await self.leitor.readline()
+        if not linha_status:
+            raise ConnectionError("conexão fechada pelo servidor")
+        versao, status = linha_status.split(b' ', 2)[:2]
+
+        tamanho = None
+        fechar = versao == b'HTTP/1.0'
+        while True:
+            linha = await self.leitor.readline()
+            if linha in (b'\r\n', b'\n', b''):
+                break
+            nome, _, valor = linha.partition(b':')
+            nome = nome.strip().lower()
+            if nome == b'content-length':
+                tamanho = int(valor)
+            elif nome == b'connection':
+                fechar = valor.strip().lower() == b'close'
+
+        if tamanho is None:
+            await self.leitor.read()
+            fechar = True
+        else:
+            await self.leitor.readexactly(tamanho)
+
+        if fechar:
+            await self.fechar()
+        return int(status)
+
+
+async def usuario(host, porta, fim, latencias, erros, indice):
+    """Envia mensagens em sequência por uma conexão até o tempo acabar"""
+    cliente = Cliente(host, porta)
+    rnd = random.Random(indice)
+    session_id = f"carga_{indice}"
+    try:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                status = await cliente.post('/chat', {'message': rnd.choice(MENSAGENS),
+                                                      'session_id': session_id})
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+                erros['conexao'] += 1
+                await cliente.fechar()
+                await asyncio.sleep(0.05)
+                continue
+            if status == 200:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                erros[f'http_{status}'] = erros.get(f'http_{status}', 0) + 1
+    finally:
+        await cliente.fechar()
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+async def executar(url, conexoes, duracao, aquecimento):
+    partes = urlsplit(url)
+    host, porta = partes.hostname, partes.port or 80
+
+    # Aquecimento curto para abrir conexões e popular caches antes de medir
+    if aquecimento > 0:
+        fim = time.perf_counter() + aquecimento
+        await asyncio.gather(*(usuario(host, porta, fim, [], {'conexao': 0}, i)
+                               for i in range(min(conexoes, 50))))
+
+    latencias = []
+    erros = {'conexao': 0}
+    inicio = time.perf_counter()
+    fim = inicio + duracao
+    await asyncio.gather(*(usuario(host, porta, fim, latencias, erros, i) for i in range(conexoes)))
+    decorrido = time.perf_counter() - inicio
+
+    return {
+        'url': url,
+        'conexoes': conexoes,
+        'duracao_s': round(decorrido, 2),
+        'requisicoes': len(latencias),
+        'req_por_s': round(len(latencias) / decorrido, 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        'max_ms': round(max(latencias, default=float('nan')) * 1000, 2),
+        'erros': {k: v for k, v in erros.items() if v},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--conexoes', type=int, default=1000)
+    parser.add_argument('--duracao', type=float, default=20, help='segundos de medição')
+    parser.add_argument('--aquecimento', type=float, default=2, help='segundos antes de medir')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args.url, args.conexoes, args.duracao, args.aquecimento))
+
+    if args.json:
+        print(json.dumps(resultado))
+        return
+
+    print(f"URL: {resultado['url']}  conexões: {resultado['conexoes']}  "
+          f"duração: {resultado['duracao_s']}s")
+    print(f"  Requisições : {resultado['requisicoes']}")
+    print(f"  Vazão       : {resultado['req_por_s']} req/s")
+    print(f"  Latência p50: {resultado['p50_ms']} ms")
+    print(f"  Latência p99: {resultado['p99_ms']} ms")
+    print(f"  Latência máx: {resultado['max_ms']} ms")
+    if resultado['erros']:
+        print(f"  Erros       : {resultado['erros']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Métricas de latência e vazão do /chat no formato texto do Prometheus.
+
+Cada thread escreve apenas nos seus próprios contadores (criados uma vez, com
+todos os buckets já alocados), então registrar uma observação não usa lock.
+A exportação soma os contadores de todas as threads; os das threads que já
+terminaram são incorporados a um acumulador para não crescerem sem limite.
+
+Com ativo=False todos os métodos viram no-ops e nem o relógio é consultado.
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+# Limites dos buckets em segundos (10µs a 1s)
+BUCKETS_PADRAO = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                  0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _zero(*args):
+    return 0
+
+
+def _nada(*args):
+    pass
+
+
+def _formatar_numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metricas:
+    """Histogramas, contadores e gauges com escrita sem lock"""
+
+    def __init__(self, ativo=True, buckets=BUCKETS_PADRAO):
+        self.ativo = ativo
+        self.buckets = tuple(buckets)
+        self._familias = {}
+        self._local = threading.local()
+        self._fragmentos = []
+        self._acumulado = {}
+        self._lock = threading.Lock()
+        self._limite_fragmentos = 64
+
+        if not ativo:
+            self.agora = _zero
+            self.etapa = _zero
+            self.observar = _nada
+            self.incrementar = _nada
+
+    # Registro das métricas (na inicialização)
+
+    def registrar_histograma(self, nome, ajuda, rotulo=None, valores=()):
+        self._familias[nome] = ('histogram', ajuda, rotulo, tuple(valores) or (None,))
+
+    def registrar_contador(self, nome, ajuda, rotulo=None, valores=()):
+        self._familias[nome] = ('counter', ajuda, rotulo, tuple(valores) or (None,))
+
+    def registrar_gauge(self, nome, ajuda, funcao):
+        """funcao() é chamada na exportação e deve retornar o valor atual"""
+        self._familias[nome] = ('gauge', ajuda, None, funcao)
+
+    # Caminho quente
+
+    def _fragmento(self):
+        """Contadores da thread atual, criados com todas as séries pré-alocadas"""
+        fragmento = getattr(self._local, 'fragmento', None)
+        if fragmento is None:
+            fragmento = {}
+            for nome, (tipo, _, _, valores) in self._familias.items():
+                if tipo != 'gauge':
+                    for valor in valores:
+                        fragmento[(nome, valor)] = self._serie_vazia(tipo)
+            self._local.fragmento = fragmento
+            with self._lock:
+                # Servidores que criam uma thread por requisição deixariam a
+                # lista crescer entre uma exportação e outra
+                if len(self._fragmentos) >= self._limite_fragmentos:
+                    self._recolher_mortos()
+                    self._limite_fragmentos = max(64, 2 * len(self._fragmentos))
+                self._fragmentos.append((weakref.ref(threading.current_thread()), fragmento))
+        return fragmento
+
+    def _serie_vazia(self, tipo):
+        # Histograma: um contador por bucket, mais +Inf, mais a soma
+        return [0] * (len(self.buckets) + 2) if tipo == 'histogram' else [0]
+
+    def agora(self):
+        return time.perf_counter()
+
+    def etapa(self, nome, valor_rotulo, inicio):
+        """Registra em `nome` a duração desde `inicio` e retorna o instante atual"""
+        fim = time.perf_counter()
+        self.observar(nome, valor_rotulo, fim - inicio)
+        return fim
+
+    def observar(self, nome, valor_rotulo, segundos):
+        fragmento = self._fragmento()
+        serie = fragmento.get((nome, valor_rotulo))
+        if serie is None:
+            serie = fragmento[(nome, valor_rotulo)] = self._serie_vazia('histogram')
+        serie[bisect_left(self.buckets, segundos)] += 1
+        serie[-1] += segundos
+
+    def incrementar(self, nome, valor_rotulo=None, quantidade=1):
+        fragmento = self._fragmento()
+        serie = fragmento.get((nome, valor_rotulo))
+        if serie is None:
+            serie = fragmento[(nome, valor_rotulo)] = [0]
+        serie[0] += quantidade
+
+    # Exportação
+
+    def _recolher_mortos(self):
+        """Incorpora ao acumulado os contadores de threads que já terminaram (com o lock)"""
+        vivos = []
+        for referencia, fragmento in self._fragmentos:
+            thread = referencia()
+            if thread is None or not thread.is_alive():
+                self._acumular(self._acumulado, fragmento)
+            else:
+                vivos.append((referencia, fragmento))
+        self._fragmentos = vivos
+
+    def _somar(self):
+        """Soma os contadores de todas as threads"""
+        with self._lock:
+            self._recolher_mortos()
+            total = {}
+            self._acumular(total, self._acumulado)
+            for _, fragmento in self._fragmentos:
+                self._acumular(total, fragmento)
+        return total
+
+    @staticmethod
+    def _acumular(destino, origem):
+        for chave, serie in list(origem.items()):
+            atual = destino.get(chave)
+            if atual is None:
+                destino[chave] = list(serie)
+            else:
+                for i, valor in enumerate(serie):
+                    atual[i] += valor
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        total = self._somar()
+        linhas = []
+        for nome, (tipo, ajuda, rotulo, valores) in self._familias.items():
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+            if tipo == 'gauge':
+                linhas.append(f"{nome} {_formatar_numero(valores())}")
+                continue
+
+            # Séries pré-registradas primeiro, depois as criadas em tempo de execução
+            chaves = [valor for valor in valores]
+            chaves += sorted((v for (n, v) in total if n == nome and v not in valores), key=str)
+
+            for valor in chaves:
+                serie = total.get((nome, valor), self._serie_vazia(tipo))
+                rotulos = f'{rotulo}="{_escapar(valor)}"' if rotulo and valor is not None else ''
+
+                if tipo == 'counter':
+                    linhas.append(f"{nome}{{{rotulos}}} {serie[0]}" if rotulos else f"{nome} {serie[0]}")
+                    continue
+
+                separador = ',' if rotulos else ''
+                acumulado = 0
+                for limite, quantidade in zip(self.buckets, serie):
+                    acumulado += quantidade
+                    linhas.append(f'{nome}_bucket{{{rotulos}{separador}le="{limite}"}} {acumulado}')
+                acumulado += serie[len(self.buckets)]
+                linhas.append(f'{nome}_bucket{{{rotulos}{separador}le="+Inf"}} {acumulado}')
+                sufixo = f"{{{rotulos}}}" if rotulos else ''
+                linhas.append(f"{nome}_sum{sufixo} {_formatar_numero(float(serie[-1]))}")
+                linhas.append(f"{nome}_count{sufixo} {acumulado}")
+
+        return '\n'.join(linhas) + '\n'
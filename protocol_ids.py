@@ -0,0 +1,155 @@
+"""
+Números de protocolo únicos entre threads e entre processos de um host.
+
+Cada número (inteiro de 63 bits, no estilo Snowflake) é formado por:
+
+    [ milissegundos desde 2024-01-01 x 4096 + sequência | worker (10 bits) ]
+
+O worker é reservado na criação do gerador com um lock exclusivo (flock) em
+um dos 1024 arquivos de PROTOCOLO_DIRETORIO; dois processos vivos nunca têm
+o mesmo worker, e o lock é liberado sozinho quando o processo termina, mesmo
+que ele caia. Após um fork, o filho reserva um worker próprio.
+
+Dentro do processo, a sequência vem de um itertools.count: next() é atômico
+sob o GIL, então gerar um número não usa lock. Os números de um processo são
+crescentes e acompanham o relógio: se mais de 4096 números são pedidos no
+mesmo milissegundo, gerar() espera o próximo milissegundo; se o contador
+ficou mais de 1 s para trás (processo ocioso), ele é adiantado (aí sim com
+um lock, no máximo uma vez por segundo). O relógio do sistema só é lido na
+criação do gerador; daí em diante o tempo vem de time.monotonic(), então um
+ajuste do relógio para trás não faz gerar() esperar.
+
+Sem fcntl (Windows), o worker é o pid módulo 1024 e a unicidade entre
+processos não é garantida. Um worker_id fixo dispensa a reserva, mas então
+cabe a quem o configura usar um valor diferente em cada processo.
+"""
+
+import itertools
+import os
+import tempfile
+import threading
+import time
+
+from fork_hooks import registrar_apos_fork
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+EPOCA_MS = 1704067200000  # 2024-01-01T00:00:00Z
+BITS_WORKER = 10
+BITS_SEQUENCIA = 12
+MAX_WORKERS = 1 << BITS_WORKER
+POR_MS = 1 << BITS_SEQUENCIA
+# Atraso do contador em relação ao relógio a partir do qual ele é adiantado
+ATRASO_MAXIMO = 1000 * POR_MS
+
+DIRETORIO_PADRAO = os.path.join(tempfile.gettempdir(), 'filazero-protocolos')
+
+
+def reservar_worker(diretorio=DIRETORIO_PADRAO):
+    """
+    Reserva um worker livre no host. Retorna (worker_id, arquivo); o worker
+    fica reservado enquanto o arquivo estiver aberto.
+    """
+    if fcntl is None:
+        return os.getpid() % MAX_WORKERS, None
+
+    os.makedirs(diretorio, exist_ok=True)
+    # Começar pelo pid espalha os processos e evita testar os mesmos arquivos
+    inicio = os.getpid() % MAX_WORKERS
+    for i in range(MAX_WORKERS):
+        worker_id = (inicio + i) % MAX_WORKERS
+        arquivo = open(os.path.join(diretorio, f'worker-{worker_id}.lock'), 'a')
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            continue
+        return worker_id, arquivo
+    raise RuntimeError(f"Todos os {MAX_WORKERS} workers de protocolo de {diretorio} estão em uso")
+
+
+def decompor(protocolo):
+    """(milissegundos desde a época, sequência, worker) de um número de protocolo"""
+    worker_id = protocolo & (MAX_WORKERS - 1)
+    tempo = protocolo >> BITS_WORKER
+    return tempo >> BITS_SEQUENCIA, tempo & (POR_MS - 1), worker_id
+
+
+class ProtocolGenerator:
+    """Gerador de números de protocolo crescentes e únicos no host"""
+
+    def __init__(self, worker_id=None, diretorio=DIRETORIO_PADRAO, relogio=time.time):
+        if worker_id is not None and not 0 <= worker_id < MAX_WORKERS:
+            raise ValueError(f"worker_id deve estar entre 0 e {MAX_WORKERS - 1}")
+
+        self.diretorio = diretorio
+        self._worker_fixo = worker_id
+        self._relogio = relogio
+        self._fechado = False
+        self._iniciar()
+        # Após um fork, cada filho reserva o seu worker
+        registrar_apos_fork(self)
+
+    def _iniciar(self):
+        if self._worker_fixo is not None:
+            self.worker_id, self._reserva = self._worker_fixo, None
+        else:
+            self.worker_id, self._reserva = reservar_worker(self.diretorio)
+        self._lock = threading.Lock()
+        self._deslocamento = self._relogio() - time.monotonic()
+        self._contador = itertools.count(self._agora())
+
+    def _apos_fork(self):
+        # A cópia do arquivo herdada do pai é fechada; o lock continua com o pai
+        if self._reserva is not None:
+            self._reserva.close()
+        if not self._fechado:
+            self._iniciar()
+
+    def _agora(self):
+        """Primeiro valor do contador no milissegundo atual"""
+        return (int((self._deslocamento + time.monotonic()) * 1000) - EPOCA_MS) * POR_MS
+
+    def gerar(self):
+        """Próximo número de protocolo"""
+        valor = next(self._contador)
+        agora = self._agora()
+        if valor < agora - ATRASO_MAXIMO:
+            valor = self._adiantar(agora)
+        elif valor >= agora + POR_MS:
+            # Mais de 4096 números neste milissegundo: espera o relógio
+            while valor >= self._agora() + POR_MS:
+                time.sleep(0.0001)
+        return (valor << BITS_WORKER) | self.worker_id
+
+    def _adiantar(self, agora):
+        """Leva o contador até o relógio. Os valores já tirados do contador antigo ficam abaixo de `agora`"""
+        with self._lock:
+            valor = next(self._contador)
+            if valor < agora - ATRASO_MAXIMO:
+                self._contador = itertools.count(agora + 1)
+                return agora
+            return valor
+
+    def fechar(self):
+        """Libera o worker reservado"""
+        self._fechado = True
+        if self._reserva is not None:
+            self._reserva.close()
+            self._reserva = None
+
+
+_padrao = None
+_padrao_lock = threading.Lock()
+
+
+def gerador_padrao():
+    """Gerador do processo com as opções padrão, criado no primeiro uso"""
+    global _padrao
+    with _padrao_lock:
+        if _padrao is None:
+            _padrao = ProtocolGenerator()
+        return _padrao
@@ -0,0 +1,79 @@
+"""
+Limites de uso do /chat: taxa por chave (token bucket) e concorrência global.
+
+Cada chave (session_id, IP do cliente) tem um balde com até `rajada` fichas,
+reabastecido a `taxa` fichas por segundo; cada requisição gasta uma ficha.
+Os baldes ficam em um OrderedDict com no máximo `max_chaves` entradas: quando
+ele enche, o balde usado há mais tempo é descartado (quem volta depois disso
+recomeça com o balde cheio). Consultar e atualizar um balde é O(1).
+
+Com taxa <= 0 (ou max_simultaneas <= 0) o limite correspondente fica desligado.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Token bucket por chave, com número de chaves limitado"""
+
+    def __init__(self, taxa, rajada, max_chaves=100000, relogio=time.monotonic):
+        if max_chaves < 1:
+            raise ValueError("max_chaves deve ser pelo menos 1")
+
+        self.taxa = taxa
+        self.rajada = max(rajada, 1)
+        self.max_chaves = max_chaves
+        self.ativo = taxa > 0
+        self._relogio = relogio
+        self._baldes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def consumir(self, chave):
+        """
+        Gasta uma ficha da chave. Retorna 0.0 se havia ficha; senão, quantos
+        segundos faltam para a próxima (e nada é gasto).
+        """
+        if not self.ativo:
+            return 0.0
+
+        agora = self._relogio()
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                if len(self._baldes) >= self.max_chaves:
+                    self._baldes.popitem(last=False)
+                # [fichas, instante da última atualização]
+                self._baldes[chave] = [self.rajada - 1, agora]
+                return 0.0
+
+            self._baldes.move_to_end(chave)
+            fichas = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+            if fichas >= 1:
+                balde[0] = fichas - 1
+                return 0.0
+            balde[0] = fichas
+            return (1 - fichas) / self.taxa
+
+
+class ConcurrencyLimiter:
+    """Limite global de requisições em processamento, sem fila: quem não cabe é recusado"""
+
+    def __init__(self, max_simultaneas):
+        self.max_simultaneas = max_simultaneas
+        self.ativo = max_simultaneas > 0
+        self._vagas = threading.BoundedSemaphore(max_simultaneas) if self.ativo else None
+
+    def entrar(self):
+        """Ocupa uma vaga, se houver. Retorna False se o limite foi atingido"""
+        return not self.ativo or self._vagas.acquire(blocking=False)
+
+    def sair(self):
+        """Libera a vaga ocupada por entrar()"""
+        if self.ativo:
+            self._vagas.release()
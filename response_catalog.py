@@ -0,0 +1,149 @@
+"""
+Catálogo de respostas fixas, renderizadas uma única vez.
+
+As respostas que não dependem da sessão (serviços, passagens, encomendas,
+horários...) são geradas na criação do catálogo e guardadas prontas, junto
+com o início do payload JSON do /chat e os eventos SSE de cada seção, já
+codificados em bytes. O catálogo não muda depois de criado: quando a base
+de conhecimento muda, o ChatBot cria um catálogo novo a partir dela e troca
+o par (base, catálogo) de uma vez.
+
+ResponseCache guarda, para as mensagens mais frequentes, a intenção e a
+resposta já resolvidas, para que uma mensagem repetida não passe de novo
+pela extração de dados, detecção de intenção e montagem da resposta.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+
+def evento_sse(evento, dados):
+    """Codifica um evento Server-Sent Events com dados em JSON"""
+    return f"event: {evento}\ndata: {json.dumps(dados)}\n\n".encode('ascii')
+
+
+def eventos_secoes(secoes):
+    """Eventos SSE 'section', um por seção do texto"""
+    return tuple(evento_sse('section', {'text': secao}) for secao in secoes)
+
+
+class _Renderizada:
+    """Formas pré-codificadas de uma resposta fixa"""
+
+    __slots__ = ('texto', 'prefixo_json', 'eventos', '__weakref__')
+
+    def __init__(self, texto, secoes):
+        self.texto = texto
+        self.prefixo_json = ('{"response":' + json.dumps(texto) + ',"session_id":').encode('ascii')
+        self.eventos = eventos_secoes(secoes)
+
+
+class ResponseCatalog:
+    """Respostas fixas por intenção, com o payload JSON e os eventos SSE pré-codificados"""
+
+    def __init__(self, geradores, compartilhado=None):
+        """
+        geradores: {intencao: função sem argumentos}. A função retorna o texto
+        ou um iterável de seções (que, concatenadas, formam o texto).
+
+        compartilhado: SharedStore opcional; catálogos de terminais diferentes
+        passam a usar o mesmo texto e os mesmos bytes para respostas iguais.
+        """
+        self._compartilhado = compartilhado
+        self._respostas, self._por_texto = self._renderizar(geradores)
+
+    def _renderizar(self, geradores):
+        respostas = {}
+        por_texto = {}
+        for intencao, gerar in geradores.items():
+            resultado = gerar()
+            secoes = (resultado,) if isinstance(resultado, str) else tuple(resultado)
+            texto = ''.join(secoes)
+            if self._compartilhado is not None:
+                renderizada = self._compartilhado.renderizada(texto, secoes, _Renderizada)
+            else:
+                renderizada = _Renderizada(texto, secoes)
+            respostas[intencao] = renderizada.texto
+            por_texto[renderizada.texto] = renderizada
+        return respostas, por_texto
+
+    def obter(self, intencao):
+        """Texto pronto da intenção, ou None se ela não for fixa"""
+        return self._respostas.get(intencao)
+
+    def payload_json(self, resposta, session_id):
+        """
+        Corpo JSON do /chat em bytes, se `resposta` for uma das respostas do
+        catálogo; None caso contrário. O texto vem do próprio catálogo, então
+        o hash da string já está calculado e a busca é uma consulta simples.
+        """
+        renderizada = self._por_texto.get(resposta)
+        if renderizada is None:
+            return None
+        return renderizada.prefixo_json + json.dumps(session_id).encode('ascii') + b'}\n'
+
+    def eventos_sse(self, resposta):
+        """Eventos SSE das seções de `resposta` (uma seção só, se ela não for do catálogo)"""
+        renderizada = self._por_texto.get(resposta)
+        if renderizada is None:
+            return eventos_secoes((resposta,))
+        return renderizada.eventos
+
+
+class ResponseCache:
+    """LRU limitado: mensagem normalizada -> (intenção, resposta)"""
+
+    def __init__(self, max_itens=1024):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        # Muda a cada invalidar(); resultados calculados antes disso são descartados
+        self.geracao = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item
+
+    def guardar(self, chave, item, geracao):
+        """
+        Guarda o item calculado na `geracao` lida antes do cálculo; se a base
+        mudou nesse meio-tempo, o item já está desatualizado e é ignorado.
+        """
+        with self._lock:
+            if geracao != self.geracao:
+                return
+            self._itens[chave] = item
+            self._itens.move_to_end(chave)
+            if len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def invalidar(self):
+        """Descarta tudo (ex.: após mudar a base de conhecimento)"""
+        with self._lock:
+            self._itens = OrderedDict()
+            self.geracao += 1
+            self.invalidacoes += 1
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            'itens': len(self._itens),
+            'max_itens': self.max_itens,
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+            'invalidacoes': self.invalidacoes,
+        }
@@ -0,0 +1,331 @@
+"""
+Snapshots das sessões em memória, para reiniciar sem perder conversas.
+
+De tempos em tempos uma thread em segundo plano grava todas as sessões do
+SessionStore em um arquivo binário; ao subir de novo, o app abre o arquivo e
+cada sessão é restaurada só no primeiro acesso a ela. Abrir o arquivo lê
+apenas o cabeçalho (o resto é mapeado em memória com mmap), então o tempo de
+inicialização não depende do número de sessões.
+
+Formato (inteiros little-endian):
+
+    cabeçalho  '<4sBdQQ'  b'FZSS', versão, momento da gravação (epoch),
+                          número de sessões, posição do índice
+    registros  '<HId'     tamanho do session_id, tamanho dos dados, último
+                          acesso (epoch), seguidos do session_id (UTF-8) e dos
+                          dados: JSON compacto [contexto, historico]
+    índice     '<QQ'      hash de 64 bits do session_id e posição do
+                          registro, ordenado pelo hash (busca binária)
+
+Sessões restauradas ou removidas (/reset) são marcadas como consumidas e não
+voltam mais do arquivo. O snapshot vale para o backend em memória; o backend
+SQLite já persiste as sessões.
+
+Com vários processos (uvicorn --workers), cada um reserva o seu arquivo com
+um lock exclusivo (flock) em `<arquivo>.lock`: o primeiro usa `caminho`, os
+demais `caminho.1`, `caminho.2`... Ao reiniciar, cada processo volta a pegar
+um dos arquivos e restaura as sessões que estavam nele. Sem fcntl (Windows)
+todos usam `caminho`, então lá o snapshot só serve para um único processo.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from fork_hooks import registrar_apos_fork
+
+MAGICO = b'FZSS'
+VERSAO = 1
+
+_CABECALHO = struct.Struct('<4sBdQQ')
+_REGISTRO = struct.Struct('<HId')
+_INDICE = struct.Struct('<QQ')
+
+# Processos com snapshot próprio no mesmo caminho
+MAX_ARQUIVOS = 64
+
+# O tamanho do session_id vai em 2 bytes no registro
+MAX_BYTES_ID = 0xFFFF
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(session_id):
+    return int.from_bytes(hashlib.blake2b(session_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def reservar_arquivo(caminho, max_arquivos=MAX_ARQUIVOS):
+    """
+    Arquivo de snapshot livre para este processo. Retorna (caminho do
+    arquivo, arquivo de lock); a reserva vale enquanto o lock estiver aberto.
+    """
+    if fcntl is None:
+        return caminho, None
+    for i in range(max_arquivos):
+        candidato = caminho if i == 0 else f'{caminho}.{i}'
+        lock = open(candidato + '.lock', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        return candidato, lock
+    raise RuntimeError(f"Todos os {max_arquivos} arquivos de snapshot de {caminho} estão em uso")
+
+
+class SessionSnapshot:
+    """Leitura preguiçosa de um arquivo de snapshot"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, 'rb') as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magico, versao, self.momento, self.total, self._indice = _CABECALHO.unpack_from(self._mapa, 0)
+        if magico != MAGICO or versao != VERSAO:
+            self._mapa.close()
+            raise ValueError(f"{caminho} não é um snapshot de sessões (versão {VERSAO})")
+        # Um bit por registro: já restaurado ou descartado
+        self._consumidas = bytearray((self.total + 7) // 8)
+        self.restantes = self.total
+
+    def _posicoes(self, session_id):
+        """Posições no índice com o hash do session_id"""
+        alvo = _hash(session_id)
+        baixo, alto = 0, self.total
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            if _INDICE.unpack_from(self._mapa, self._indice + meio * _INDICE.size)[0] < alvo:
+                baixo = meio + 1
+            else:
+                alto = meio
+        while baixo < self.total:
+            h, posicao = _INDICE.unpack_from(self._mapa, self._indice + baixo * _INDICE.size)
+            if h != alvo:
+                break
+            yield baixo, posicao
+            baixo += 1
+
+    def _ler(self, posicao):
+        tamanho_id, tamanho_dados, ultimo_acesso = _REGISTRO.unpack_from(self._mapa, posicao)
+        inicio = posicao + _REGISTRO.size
+        session_id = self._mapa[inicio:inicio + tamanho_id].decode('utf-8')
+        dados = self._mapa[inicio + tamanho_id:inicio + tamanho_id + tamanho_dados]
+        return session_id, dados, ultimo_acesso
+
+    def _consumida(self, i):
+        return self._consumidas[i >> 3] & (1 << (i & 7))
+
+    def _consumir(self, i):
+        if not self._consumida(i):
+            self._consumidas[i >> 3] |= 1 << (i & 7)
+            self.restantes -= 1
+
+    def _localizar(self, session_id):
+        if not isinstance(session_id, str):
+            return None, None
+        for i, posicao in self._posicoes(session_id):
+            if not self._consumida(i):
+                lido = self._ler(posicao)
+                if lido[0] == session_id:
+                    return i, lido
+        return None, None
+
+    def restaurar(self, session_id, ttl=None):
+        """
+        (contexto, historico, último acesso em epoch) da sessão, ou None se
+        ela não está no arquivo, já foi consumida ou expirou. Cada sessão é
+        devolvida no máximo uma vez.
+        """
+        i, lido = self._localizar(session_id)
+        if i is None:
+            return None
+        self._consumir(i)
+        _, dados, ultimo_acesso = lido
+        if ttl is not None and time.time() - ultimo_acesso > ttl:
+            return None
+        contexto, historico = json.loads(dados)
+        return contexto, historico, ultimo_acesso
+
+    def descartar(self, session_id):
+        """Marca a sessão como consumida sem restaurá-la. Retorna True se ela estava lá"""
+        i, _ = self._localizar(session_id)
+        if i is None:
+            return False
+        self._consumir(i)
+        return True
+
+    def pendentes(self):
+        """(índice, session_id, dados, último acesso) das sessões ainda não consumidas"""
+        for i in range(self.total):
+            if not self._consumida(i):
+                _, posicao = _INDICE.unpack_from(self._mapa, self._indice + i * _INDICE.size)
+                yield (i,) + self._ler(posicao)
+
+    def fechar(self):
+        self._mapa.close()
+
+
+def gravar_snapshot(caminho, sessoes, anterior=None, ttl=None):
+    """
+    Grava o snapshot em um arquivo temporário e o coloca no lugar de `caminho`.
+
+    sessoes: iterável de (session_id, contexto, historico, último acesso em
+    epoch). As sessões do snapshot `anterior` que ainda não foram consumidas
+    nem estão em `sessoes` (e não expiraram) são copiadas para o novo arquivo.
+
+    Retorna (SessionSnapshot do novo arquivo, [(posição no índice novo,
+    posição no índice anterior)] das copiadas); as demais já nascem consumidas.
+    """
+    # O nome do temporário inclui o pid: processos diferentes nunca gravam no mesmo
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    try:
+        entradas, copiadas = _gravar_arquivo(temporario, sessoes, anterior, ttl)
+        os.replace(temporario, caminho)
+    except BaseException:
+        try:
+            os.remove(temporario)
+        except OSError:
+            pass
+        raise
+
+    novo = SessionSnapshot(caminho)
+    pares = []
+    for i, (_, p) in enumerate(entradas):
+        if p in copiadas:
+            pares.append((i, copiadas[p]))
+        else:
+            # Veio da memória: quem tem a versão atual é o SessionStore
+            novo._consumir(i)
+    return novo, pares
+
+
+def _gravar_arquivo(caminho, sessoes, anterior, ttl):
+    """Escreve o arquivo; retorna ([(hash, posição)] ordenado, {posição: índice anterior} das copiadas)"""
+    entradas = []
+    vistas = set()
+    copiadas = {}
+    agora = time.time()
+
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(b'\0' * _CABECALHO.size)
+        posicao = _CABECALHO.size
+
+        def escrever(session_id, dados, ultimo_acesso):
+            nonlocal posicao
+            chave = session_id.encode('utf-8')
+            if len(chave) > MAX_BYTES_ID:
+                # Não cabe no registro: a sessão fica fora do snapshot, as demais são gravadas
+                return
+            arquivo.write(_REGISTRO.pack(len(chave), len(dados), ultimo_acesso) + chave + dados)
+            entradas.append((_hash(session_id), posicao))
+            posicao += _REGISTRO.size + len(chave) + len(dados)
+            # Libera o GIL de tempos em tempos para não atrasar as requisições
+            if len(entradas) % 1000 == 0:
+                time.sleep(0)
+
+        for session_id, contexto, historico, ultimo_acesso in sessoes:
+            if not isinstance(session_id, str):
+                # Só sessões com id em texto podem ser restauradas
+                continue
+            vistas.add(session_id)
+            dados = json.dumps([contexto, historico], ensure_ascii=False, separators=(',', ':'))
+            escrever(session_id, dados.encode('utf-8'), ultimo_acesso)
+
+        if anterior is not None:
+            for i, session_id, dados, ultimo_acesso in anterior.pendentes():
+                if session_id in vistas or (ttl is not None and agora - ultimo_acesso > ttl):
+                    continue
+                copiadas[posicao] = i
+                escrever(session_id, dados, ultimo_acesso)
+
+        entradas.sort()
+        indice = posicao
+        arquivo.write(b''.join(_INDICE.pack(h, p) for h, p in entradas))
+        arquivo.seek(0)
+        arquivo.write(_CABECALHO.pack(MAGICO, VERSAO, agora, len(entradas), indice))
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    return entradas, copiadas
+
+
+class SessionSnapshotter:
+    """Grava snapshots de um SessionStore periodicamente, em segundo plano"""
+
+    def __init__(self, store, caminho, intervalo=30.0):
+        """caminho: arquivo do primeiro processo; os demais usam caminho.1, caminho.2..."""
+        self.store = store
+        self.caminho_base = caminho
+        self.intervalo = intervalo
+        self.gravacoes = 0
+        self.falhas = 0
+        self.ultima_duracao = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.caminho, self._reserva = reservar_arquivo(caminho)
+
+        # Snapshot de uma execução anterior: restaurado sob demanda
+        if os.path.exists(self.caminho):
+            try:
+                store.snapshot = SessionSnapshot(self.caminho)
+            except (OSError, ValueError, struct.error) as erro:
+                logger.warning("Snapshot de sessões ignorado (%s): %s", self.caminho, erro)
+                store.snapshot = None
+
+        # Após um fork, cada filho reserva o seu arquivo e inicia a sua thread
+        registrar_apos_fork(self)
+
+    def gravar(self):
+        """
+        Grava um snapshot agora (também chamado ao encerrar). Retorna False se
+        a gravação falhou; o snapshot anterior continua valendo.
+        """
+        with self._lock:
+            inicio = time.perf_counter()
+            anterior = self.store.snapshot
+            try:
+                novo, pares = gravar_snapshot(self.caminho, self.store.exportar(), anterior, self.store.ttl)
+            except (OSError, ValueError, TypeError, struct.error) as erro:
+                self.falhas += 1
+                logger.warning("Snapshot de sessões não gravado (%s): %s", self.caminho, erro)
+                return False
+            self.store.trocar_snapshot(novo, pares)
+            self.gravacoes += 1
+            self.ultima_duracao = time.perf_counter() - inicio
+            return True
+
+    def iniciar(self):
+        if self._thread is None and self.intervalo > 0:
+            self._thread = threading.Thread(target=self._executar, name='session-snapshot', daemon=True)
+            self._thread.start()
+
+    def _apos_fork(self):
+        # A cópia do lock herdada do pai é fechada; a reserva continua com o pai
+        self._lock = threading.Lock()
+        if self._reserva is not None:
+            self._reserva.close()
+        self.caminho, self._reserva = reservar_arquivo(self.caminho_base)
+        if self._thread is not None and not self._parar.is_set():
+            self._thread = None
+            self.iniciar()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.gravar()
+
+    def parar(self):
+        """Interrompe a thread e grava um último snapshot"""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.gravar()
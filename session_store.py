@@ -0,0 +1,443 @@
+"""
+Armazenamento de sessões do chatbot com limite de tamanho.
+
+Cada sessão guarda o contexto do ChatBot (coleta de contato) e o histórico da
+conversa. Os backends mantêm no máximo `max_sessoes` sessões, descartam as
+que ficaram ociosas por mais de `ttl` segundos e, quando cheios, removem as
+menos usadas recentemente. O histórico de cada sessão também é limitado.
+
+Backends disponíveis:
+- SessionStore: em memória, por processo (padrão)
+- SQLiteSessionBackend: arquivo SQLite em modo WAL, compartilhado entre os
+  workers de um mesmo host
+
+Em cada requisição a sessão é lida uma vez (obter) e gravada uma vez
+(salvar), então cada uma dessas operações é uma única consulta no SQLite.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Sessao:
+    """Estado de uma conversa: contexto do bot e histórico limitado"""
+
+    __slots__ = ('contexto', 'historico', 'ultimo_acesso')
+
+    def __init__(self, max_historico=None, contexto=None, historico=(), ultimo_acesso=0.0):
+        self.contexto = contexto if contexto is not None else {}
+        self.historico = deque(historico, maxlen=max_historico)
+        self.ultimo_acesso = ultimo_acesso
+
+
+def estimar_bytes(sessao):
+    """
+    Estimativa da memória ocupada por uma sessão (sys.getsizeof do objeto,
+    do contexto, do histórico e do que eles contêm). Textos compartilhados
+    com outras estruturas, como as respostas do catálogo, também são
+    contados, então o valor é um limite superior.
+    """
+    total = sys.getsizeof(sessao) + sys.getsizeof(sessao.historico)
+    pendentes = [sessao.contexto]
+    pendentes.extend(sessao.historico)
+    while pendentes:
+        valor = pendentes.pop()
+        total += sys.getsizeof(valor)
+        if isinstance(valor, dict):
+            pendentes.extend(valor.keys())
+            pendentes.extend(valor.values())
+        elif isinstance(valor, (list, tuple)):
+            pendentes.extend(valor)
+    return total
+
+
+class SessionLocks:
+    """
+    Locks por sessão em faixas (lock striping).
+
+    Requisições da mesma sessão usam sempre o mesmo lock e são serializadas;
+    sessões diferentes caem, na maioria das vezes, em faixas diferentes e
+    seguem em paralelo. A memória é fixa, independente do número de sessões.
+    """
+
+    def __init__(self, faixas=1024):
+        self._locks = tuple(threading.Lock() for _ in range(faixas))
+
+    def de(self, session_id):
+        """Lock responsável pela sessão"""
+        return self._locks[hash(session_id) % len(self._locks)]
+
+
+class SessionBackend:
+    """Interface comum dos backends de sessão"""
+
+    def obter(self, session_id):
+        """Retorna a sessão, criando uma nova se não existir ou tiver expirado"""
+        raise NotImplementedError
+
+    def salvar(self, session_id, sessao):
+        """Persiste a sessão depois que a requisição terminou de alterá-la"""
+        raise NotImplementedError
+
+    def remover(self, session_id):
+        """Remove a sessão (usado pelo /reset). Retorna True se ela existia"""
+        raise NotImplementedError
+
+    def expirar(self, limite=None):
+        """
+        Remove as sessões ociosas (no máximo `limite`, se informado). Retorna
+        quantas foram removidas
+        """
+        raise NotImplementedError
+
+    def tamanhos(self):
+        """Gera (session_id, bytes estimados) de cada sessão guardada"""
+        raise NotImplementedError
+
+    def metricas(self):
+        """Contadores de uso e remoção de sessões"""
+        raise NotImplementedError
+
+
+class SessionStore(SessionBackend):
+    """Sessões em memória com LRU, TTL de ociosidade e métricas de remoção"""
+
+    def __init__(self, max_sessoes=10000, ttl=1800, max_historico=50, relogio=time.monotonic):
+        if max_sessoes < 1:
+            raise ValueError("max_sessoes deve ser pelo menos 1")
+
+        self.max_sessoes = max_sessoes
+        self.ttl = ttl
+        self.max_historico = max_historico
+        self._relogio = relogio
+        self._sessoes = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._criadas = 0
+        self._restauradas = 0
+        self._removidas_lru = 0
+        self._removidas_ttl = 0
+        self._removidas_reset = 0
+
+        # Snapshot de uma execução anterior (session_snapshot.SessionSnapshot):
+        # sessões que não estão na memória são procuradas nele no primeiro acesso
+        self.snapshot = None
+
+    def __len__(self):
+        return len(self._sessoes)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessoes
+
+    def _expirada(self, sessao, agora):
+        return self.ttl is not None and agora - sessao.ultimo_acesso > self.ttl
+
+    def _expirar_antigas(self, agora, limite=None):
+        """Remove sessões ociosas do início da fila (as menos usadas recentemente)"""
+        removidas = 0
+        while self._sessoes and (limite is None or removidas < limite):
+            session_id, sessao = next(iter(self._sessoes.items()))
+            if not self._expirada(sessao, agora):
+                break
+            del self._sessoes[session_id]
+            self._removidas_ttl += 1
+            removidas += 1
+
+    def obter(self, session_id):
+        """Retorna a sessão, criando-a se não existir ou se tiver expirado"""
+        agora = self._relogio()
+        with self._lock:
+            sessao = self._sessoes.get(session_id)
+
+            if sessao is not None and self._expirada(sessao, agora):
+                del self._sessoes[session_id]
+                self._removidas_ttl += 1
+                sessao = None
+
+            if sessao is None:
+                self._expirar_antigas(agora)
+                while len(self._sessoes) >= self.max_sessoes:
+                    self._sessoes.popitem(last=False)
+                    self._removidas_lru += 1
+
+                sessao = self._restaurar(session_id, agora)
+                if sessao is None:
+                    sessao = Sessao(self.max_historico)
+                    self._criadas += 1
+                self._sessoes[session_id] = sessao
+            else:
+                self._sessoes.move_to_end(session_id)
+
+            sessao.ultimo_acesso = agora
+            return sessao
+
+    def _restaurar(self, session_id, agora):
+        """Sessão guardada no snapshot, se ainda não foi restaurada nem expirou"""
+        if self.snapshot is None:
+            return None
+        restaurada = self.snapshot.restaurar(session_id, self.ttl)
+        if restaurada is None:
+            return None
+        contexto, historico, _ = restaurada
+        self._restauradas += 1
+        return Sessao(self.max_historico, contexto, historico)
+
+    def salvar(self, session_id, sessao):
+        """A sessão já é o próprio objeto guardado; nada a persistir"""
+
+    def remover(self, session_id):
+        with self._lock:
+            # Também no snapshot, para que o /reset não seja desfeito depois
+            no_snapshot = self.snapshot is not None and self.snapshot.descartar(session_id)
+            if self._sessoes.pop(session_id, None) is None and not no_snapshot:
+                return False
+            self._removidas_reset += 1
+            return True
+
+    def exportar(self):
+        """
+        Cópia das sessões para o snapshot: gera (session_id, contexto,
+        historico, último acesso em epoch). O lock é mantido só para copiar
+        os session_ids; cada sessão é copiada depois, sem bloquear as
+        requisições (as removidas nesse meio tempo ficam de fora).
+        """
+        ids = self._ids()
+        # Relógio do store (monotônico) -> epoch, que sobrevive a um reinício
+        deslocamento = time.time() - self._relogio()
+        buscar = self._sessoes.get
+        for session_id in ids:
+            sessao = buscar(session_id)
+            if sessao is not None:
+                # dict() e list() copiam em uma única operação, sem intercalar
+                # com as threads que alteram a sessão
+                yield (session_id, dict(sessao.contexto), list(sessao.historico),
+                       sessao.ultimo_acesso + deslocamento)
+
+    def trocar_snapshot(self, novo, pares):
+        """
+        Passa a restaurar sessões de `novo`, recém-gravado a partir do atual.
+        pares: (posição em novo, posição no atual) das sessões copiadas do
+        atual; as que foram consumidas durante a gravação também são
+        consumidas em novo.
+        """
+        with self._lock:
+            anterior, self.snapshot = self.snapshot, novo
+            if anterior is not None:
+                for i, j in pares:
+                    if anterior._consumida(j):
+                        novo._consumir(i)
+                anterior.fechar()
+
+    def expirar(self, limite=None):
+        with self._lock:
+            antes = self._removidas_ttl
+            self._expirar_antigas(self._relogio(), limite)
+            return self._removidas_ttl - antes
+
+    def _ids(self):
+        """Cópia dos session_ids; o lock é mantido só durante a cópia"""
+        with self._lock:
+            return list(self._sessoes)
+
+    def tamanhos(self):
+        """As sessões são lidas uma a uma, sem o lock (as removidas no meio tempo ficam de fora)"""
+        buscar = self._sessoes.get
+        for session_id in self._ids():
+            sessao = buscar(session_id)
+            if sessao is not None:
+                yield session_id, estimar_bytes(sessao)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                'sessoes_ativas': len(self._sessoes),
+                'max_sessoes': self.max_sessoes,
+                'sessoes_criadas': self._criadas,
+                'sessoes_restauradas': self._restauradas,
+                'sessoes_no_snapshot': self.snapshot.restantes if self.snapshot is not None else 0,
+                'removidas_lru': self._removidas_lru,
+                'removidas_ttl': self._removidas_ttl,
+                'removidas_reset': self._removidas_reset,
+            }
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Sessões em um arquivo SQLite (modo WAL) compartilhado entre processos.
+
+    Cada thread de cada processo reutiliza a sua própria conexão. A limpeza de
+    sessões expiradas e excedentes roda a cada `limpeza_a_cada` gravações, fora
+    da leitura/gravação da sessão em si.
+    """
+
+    def __init__(self, caminho, max_sessoes=10000, ttl=1800, max_historico=50,
+                 limpeza_a_cada=500, relogio=time.time):
+        if max_sessoes < 1:
+            raise ValueError("max_sessoes deve ser pelo menos 1")
+
+        self.caminho = caminho
+        self.max_sessoes = max_sessoes
+        self.ttl = ttl
+        self.max_historico = max_historico
+        self.limpeza_a_cada = limpeza_a_cada
+        self._relogio = relogio
+        self._local = threading.local()
+        self._contadores_lock = threading.Lock()
+
+        self._criadas = 0
+        self._gravacoes = 0
+        self._removidas_lru = 0
+        self._removidas_ttl = 0
+        self._removidas_reset = 0
+
+        conexao = self._conexao()
+        with conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS sessoes ("
+                " session_id TEXT PRIMARY KEY,"
+                " dados TEXT NOT NULL,"
+                " ultimo_acesso REAL NOT NULL)"
+            )
+            conexao.execute(
+                "CREATE INDEX IF NOT EXISTS sessoes_ultimo_acesso ON sessoes (ultimo_acesso)"
+            )
+
+    def _conexao(self):
+        """Conexão da thread atual, reaberta se o processo foi criado por fork"""
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def _expirada(self, ultimo_acesso, agora):
+        return self.ttl is not None and agora - ultimo_acesso > self.ttl
+
+    def obter(self, session_id):
+        agora = self._relogio()
+        linha = self._conexao().execute(
+            "SELECT dados, ultimo_acesso FROM sessoes WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+        if linha is not None and not self._expirada(linha[1], agora):
+            dados = json.loads(linha[0])
+            return Sessao(self.max_historico, dados['contexto'], dados['historico'], agora)
+
+        with self._contadores_lock:
+            self._criadas += 1
+            if linha is not None:
+                self._removidas_ttl += 1
+        return Sessao(self.max_historico, ultimo_acesso=agora)
+
+    def salvar(self, session_id, sessao):
+        dados = json.dumps(
+            {'contexto': sessao.contexto, 'historico': list(sessao.historico)},
+            ensure_ascii=False, separators=(',', ':')
+        )
+        self._conexao().execute(
+            "INSERT INTO sessoes (session_id, dados, ultimo_acesso) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET dados = excluded.dados, "
+            "ultimo_acesso = excluded.ultimo_acesso",
+            (session_id, dados, sessao.ultimo_acesso)
+        )
+
+        with self._contadores_lock:
+            self._gravacoes += 1
+            limpar = self._gravacoes % self.limpeza_a_cada == 0
+        if limpar:
+            self._limpar()
+
+    def _limpar(self):
+        """Remove sessões expiradas e, se ainda houver excesso, as mais antigas"""
+        conexao = self._conexao()
+        with conexao:
+            removidas_ttl = 0
+            if self.ttl is not None:
+                removidas_ttl = conexao.execute(
+                    "DELETE FROM sessoes WHERE ultimo_acesso < ?", (self._relogio() - self.ttl,)
+                ).rowcount
+
+            excesso = conexao.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0] - self.max_sessoes
+            removidas_lru = 0
+            if excesso > 0:
+                removidas_lru = conexao.execute(
+                    "DELETE FROM sessoes WHERE session_id IN ("
+                    " SELECT session_id FROM sessoes ORDER BY ultimo_acesso LIMIT ?)",
+                    (excesso,)
+                ).rowcount
+
+        with self._contadores_lock:
+            self._removidas_ttl += removidas_ttl
+            self._removidas_lru += removidas_lru
+        return removidas_ttl
+
+    def remover(self, session_id):
+        removida = self._conexao().execute(
+            "DELETE FROM sessoes WHERE session_id = ?", (session_id,)
+        ).rowcount > 0
+        if removida:
+            with self._contadores_lock:
+                self._removidas_reset += 1
+        return removida
+
+    def expirar(self, limite=None):
+        if limite is None:
+            return self._limpar()
+        if self.ttl is None:
+            return 0
+        removidas = self._conexao().execute(
+            "DELETE FROM sessoes WHERE session_id IN ("
+            " SELECT session_id FROM sessoes WHERE ultimo_acesso < ? LIMIT ?)",
+            (self._relogio() - self.ttl, limite)
+        ).rowcount
+        with self._contadores_lock:
+            self._removidas_ttl += removidas
+        return removidas
+
+    def tamanhos(self, pagina=500):
+        """
+        Tamanho, em bytes, dos dados gravados de cada sessão. A tabela é lida
+        em páginas de `pagina` sessões pela chave primária, uma consulta curta
+        por página; quem consome pode pausar entre elas.
+        """
+        conexao = self._conexao()
+        ultimo = ''
+        while True:
+            linhas = conexao.execute(
+                "SELECT session_id, length(CAST(dados AS BLOB)) FROM sessoes"
+                " WHERE session_id > ? ORDER BY session_id LIMIT ?",
+                (ultimo, pagina)
+            ).fetchall()
+            yield from linhas
+            if len(linhas) < pagina:
+                return
+            ultimo = linhas[-1][0]
+
+    def metricas(self):
+        ativas = self._conexao().execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+        with self._contadores_lock:
+            return {
+                'sessoes_ativas': ativas,
+                'max_sessoes': self.max_sessoes,
+                'sessoes_criadas': self._criadas,
+                'removidas_lru': self._removidas_lru,
+                'removidas_ttl': self._removidas_ttl,
+                'removidas_reset': self._removidas_reset,
+            }
+
+
+def criar_session_backend(tipo='memoria', caminho='sessoes.db', **opcoes):
+    """Cria o backend de sessões pelo nome ('memoria' ou 'sqlite')"""
+    if tipo == 'memoria':
+        return SessionStore(**opcoes)
+    if tipo == 'sqlite':
+        return SQLiteSessionBackend(caminho, **opcoes)
+    raise ValueError(f"Backend de sessão desconhecido: {tipo}")
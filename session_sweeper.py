@@ -0,0 +1,121 @@
+"""
+Varredura das sessões em segundo plano: expiração e uso de memória.
+
+Sem a varredura, uma sessão ociosa só sai da memória quando outra sessão é
+criada (ou pelo /reset). A cada `intervalo` segundos uma thread remove as
+sessões ociosas, em lotes de no máximo `lote` por vez, e depois percorre as
+sessões restantes estimando os bytes de cada uma. O trabalho é dividido em
+fatias de `fatia` segundos, com uma pausa entre elas, para não competir com
+as requisições pelo lock do store nem pelo GIL.
+
+O resultado da última varredura (total de sessões, bytes e as maiores
+sessões) fica em relatorio().
+"""
+
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+
+from fork_hooks import registrar_apos_fork
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    """Expira sessões ociosas e mede a memória delas, em fatias de tempo"""
+
+    def __init__(self, store, intervalo=10.0, lote=200, fatia=0.002, pausa=0.001, maiores=10):
+        self.store = store
+        self.intervalo = intervalo
+        self.lote = lote
+        self.fatia = fatia
+        self.pausa = pausa
+        self.maiores = maiores
+        self.varreduras = 0
+        self.expiradas = 0
+        self.falhas = 0
+        self._relatorio = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._inicio_fatia = 0.0
+        # Após um fork, cada filho inicia a sua thread
+        registrar_apos_fork(self)
+
+    def _ceder(self):
+        """Pausa se a fatia de tempo atual acabou"""
+        if time.perf_counter() - self._inicio_fatia >= self.fatia:
+            time.sleep(self.pausa)
+            self._inicio_fatia = time.perf_counter()
+
+    def varrer(self):
+        """Faz uma varredura completa agora e retorna o relatório"""
+        with self._lock:
+            inicio = time.perf_counter()
+            self._inicio_fatia = inicio
+
+            expiradas = 0
+            while True:
+                removidas = self.store.expirar(self.lote)
+                expiradas += removidas
+                if removidas < self.lote:
+                    break
+                self._ceder()
+
+            sessoes = 0
+            total = 0
+            maiores = []
+            for session_id, tamanho in self.store.tamanhos():
+                sessoes += 1
+                total += tamanho
+                if len(maiores) < self.maiores:
+                    heapq.heappush(maiores, (tamanho, session_id))
+                elif tamanho > maiores[0][0]:
+                    heapq.heapreplace(maiores, (tamanho, session_id))
+                self._ceder()
+
+            self.varreduras += 1
+            self.expiradas += expiradas
+            self._relatorio = {
+                'sessoes': sessoes,
+                'bytes': total,
+                'bytes_por_sessao': total // sessoes if sessoes else 0,
+                'maiores': [{'session_id': session_id, 'bytes': tamanho}
+                            for tamanho, session_id in sorted(maiores, reverse=True)],
+                'expiradas': expiradas,
+                'duracao_segundos': round(time.perf_counter() - inicio, 6),
+                'momento': time.time(),
+            }
+            return self._relatorio
+
+    def relatorio(self):
+        """Relatório da última varredura, ou None se ainda não houve nenhuma"""
+        return self._relatorio
+
+    def iniciar(self):
+        if self._thread is None and self.intervalo > 0:
+            self._thread = threading.Thread(target=self._executar, name='session-sweeper', daemon=True)
+            self._thread.start()
+
+    def _apos_fork(self):
+        # A cópia do lock herdada do pai pode estar fechada (varredura em andamento)
+        self._lock = threading.Lock()
+        if self._thread is not None and not self._parar.is_set():
+            self._thread = None
+            self.iniciar()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.varrer()
+            except (OSError, ValueError, sqlite3.Error) as erro:
+                # Ex.: 'database is locked' no SQLite; a próxima varredura tenta de novo
+                self.falhas += 1
+                logger.warning("Varredura de sessões falhou: %s", erro)
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,131 @@
+"""
+Arquivos estáticos e página inicial prontos para servir, e compressão negociada.
+
+StaticAssets lê os arquivos de static/ uma única vez e dá a cada um uma URL
+com o hash do conteúdo no nome (css/style.css -> css/style.<hash>.css). Como
+a URL muda quando o arquivo muda, ela pode ser guardada pelo navegador para
+sempre (Cache-Control: immutable). Cada arquivo de texto já fica comprimido
+em gzip e, se o módulo brotli estiver instalado, em brotli, no nível máximo:
+servir um arquivo não comprime nada.
+
+Variantes guarda um conteúdo fixo (arquivo ou página pré-renderizada) com o
+ETag e as versões comprimidas; escolher() devolve a melhor para o cabeçalho
+Accept-Encoding do cliente. comprimir() atende as respostas dinâmicas (JSON
+do /chat), com um nível mais rápido.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele, só gzip
+    brotli = None
+
+# Em ordem de preferência quando o cliente aceita as duas com o mesmo peso
+CODIFICACOES = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Tipos que valem a pena comprimir
+COMPRIMIVEIS = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson', 'image/svg+xml',
+})
+
+
+def escolher_codificacao(aceitas, disponiveis=CODIFICACOES):
+    """
+    Melhor codificação de `disponiveis` aceita pelo cabeçalho Accept-Encoding
+    (respeitando os pesos q=), ou None para enviar sem compressão.
+    """
+    if not aceitas:
+        return None
+    pesos = {}
+    for parte in aceitas.split(','):
+        nome, _, parametros = parte.partition(';')
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        pesos[nome.strip().lower()] = peso
+
+    melhor, melhor_peso = None, 0.0
+    for codificacao in disponiveis:
+        peso = pesos.get(codificacao, pesos.get('*', 0.0))
+        if peso > melhor_peso:
+            melhor, melhor_peso = codificacao, peso
+    return melhor
+
+
+def comprimir(corpo, codificacao, maximo=False):
+    """corpo comprimido; `maximo` usa o nível mais alto (para conteúdo comprimido uma única vez)"""
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=11 if maximo else 5)
+    if codificacao == 'gzip':
+        return gzip.compress(corpo, compresslevel=9 if maximo else 6, mtime=0)
+    raise ValueError(f"codificação não suportada: {codificacao}")
+
+
+class Variantes:
+    """Conteúdo fixo com ETag e as versões pré-comprimidas"""
+
+    __slots__ = ('corpo', 'tipo', 'etag', 'comprimidos')
+
+    def __init__(self, corpo, tipo):
+        self.corpo = corpo
+        self.tipo = tipo
+        self.etag = hashlib.blake2b(corpo, digest_size=8).hexdigest()
+        self.comprimidos = {}
+        if tipo in COMPRIMIVEIS:
+            for codificacao in CODIFICACOES:
+                comprimido = comprimir(corpo, codificacao, maximo=True)
+                # Conteúdos muito pequenos podem crescer
+                if len(comprimido) < len(corpo):
+                    self.comprimidos[codificacao] = comprimido
+
+    def escolher(self, aceitas):
+        """(corpo, codificação ou None, ETag) da melhor versão para o Accept-Encoding"""
+        codificacao = escolher_codificacao(aceitas, tuple(self.comprimidos))
+        if codificacao is None:
+            return self.corpo, None, self.etag
+        # Cada versão é uma representação diferente e tem o seu próprio ETag
+        return self.comprimidos[codificacao], codificacao, f'{self.etag}-{codificacao}'
+
+
+def _nome_com_hash(nome, etag):
+    raiz, extensao = os.path.splitext(nome)
+    return f'{raiz}.{etag[:12]}{extensao}'
+
+
+class StaticAssets:
+    """Arquivos de um diretório em memória, com URL pelo conteúdo e versões pré-comprimidas"""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._nomes = {}
+        self._variantes = {}
+        for pasta, _, arquivos in os.walk(diretorio):
+            for arquivo in arquivos:
+                caminho = os.path.join(pasta, arquivo)
+                nome = os.path.relpath(caminho, diretorio).replace(os.sep, '/')
+                with open(caminho, 'rb') as entrada:
+                    corpo = entrada.read()
+                tipo = mimetypes.guess_type(arquivo)[0] or 'application/octet-stream'
+                variantes = Variantes(corpo, tipo)
+                self._nomes[nome] = _nome_com_hash(nome, variantes.etag)
+                self._variantes[self._nomes[nome]] = variantes
+
+    def __len__(self):
+        return len(self._variantes)
+
+    def url(self, nome):
+        """Nome com o hash do conteúdo ('css/style.css' -> 'css/style.<hash>.css')"""
+        return self._nomes.get(nome, nome)
+
+    def obter(self, nome_com_hash):
+        """Variantes do arquivo, ou None se o nome (com hash) não existe"""
+        return self._variantes.get(nome_com_hash)
@@ -0,0 +1,228 @@
+"""
+Vários terminais (bases de conhecimento) atendidos pelo mesmo processo.
+
+Cada terminal tem o seu arquivo de base em um diretório (`<terminal>.json`,
+`.yaml` ou `.yml`) e o seu ChatBot. Um terminal só é carregado na primeira
+requisição para ele e é descarregado depois de `ociosidade` segundos sem uso
+(ou quando há mais de `max_terminais` carregados, o usado há mais tempo);
+uma thread em segundo plano faz esse descarte e recarrega as bases cujos
+arquivos mudaram.
+
+SharedStore evita repetir o que é igual entre terminais: detectores de
+intenção compilados (por conjunto de intenções) e respostas renderizadas
+(texto, payload JSON e eventos SSE, por texto). Os itens ficam em dicionários
+de referências fracas e somem quando nenhum terminal carregado os usa, então
+o custo de mais um terminal parecido com os outros é pequeno.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+
+from fork_hooks import registrar_apos_fork
+from intent_matcher import IntentMatcher
+from knowledge_base import KnowledgeBase
+
+# Identificador de terminal aceito (também é o nome do arquivo da base)
+TERMINAL_RE = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+EXTENSOES = ('.json', '.yaml', '.yml')
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStore:
+    """Detectores e respostas renderizadas compartilhados entre terminais"""
+
+    def __init__(self):
+        self._detectores = weakref.WeakValueDictionary()
+        self._renderizadas = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def detector(self, intencoes):
+        """Detector das intenções, compilado só se nenhum terminal já tem um igual"""
+        with self._lock:
+            detector = self._detectores.get(intencoes)
+        if detector is not None:
+            return detector
+        # Compila fora do lock; se outro terminal compilou antes, usa o dele
+        novo = IntentMatcher(intencoes)
+        with self._lock:
+            detector = self._detectores.get(intencoes)
+            if detector is None:
+                detector = self._detectores[intencoes] = novo
+        return detector
+
+    def renderizada(self, texto, secoes, criar):
+        """Resposta renderizada com este texto e estas seções (criar(texto, secoes) se não houver)"""
+        chave = (texto, secoes)
+        with self._lock:
+            renderizada = self._renderizadas.get(chave)
+            if renderizada is None:
+                renderizada = self._renderizadas[chave] = criar(texto, secoes)
+        return renderizada
+
+    def estatisticas(self):
+        return {'detectores': len(self._detectores), 'respostas_renderizadas': len(self._renderizadas)}
+
+
+class Terminal:
+    """Um terminal carregado: a base (observada) e o ChatBot que a usa"""
+
+    __slots__ = ('id', 'base', 'chatbot', 'ultimo_acesso')
+
+    def __init__(self, terminal_id, base, chatbot, ultimo_acesso):
+        self.id = terminal_id
+        self.base = base
+        self.chatbot = chatbot
+        self.ultimo_acesso = ultimo_acesso
+
+
+class TenantRegistry:
+    """Terminais carregados sob demanda e descarregados quando ociosos"""
+
+    def __init__(self, diretorio, criar_chatbot, compartilhado=None, max_terminais=500,
+                 ociosidade=900, intervalo=2.0, relogio=time.monotonic):
+        """
+        criar_chatbot(terminal_id, base): ChatBot do terminal, a partir da
+        KnowledgeBase dele; deve assinar a base para acompanhar as recargas.
+        """
+        if max_terminais < 1:
+            raise ValueError("max_terminais deve ser pelo menos 1")
+
+        self.diretorio = diretorio
+        self.criar_chatbot = criar_chatbot
+        self.compartilhado = compartilhado if compartilhado is not None else SharedStore()
+        self.max_terminais = max_terminais
+        self.ociosidade = ociosidade
+        self.intervalo = intervalo
+        self._relogio = relogio
+        self._terminais = {}
+        # _lock protege o dicionário; cada carga tem o seu lock em _carregando,
+        # para que um terminal lento de carregar não atrase os outros
+        self._lock = threading.Lock()
+        self._carregando = {}
+        self._parar = threading.Event()
+        self._thread = None
+
+        self.carregados = 0
+        self.descarregados = 0
+
+    def __len__(self):
+        return len(self._terminais)
+
+    def __contains__(self, terminal_id):
+        return terminal_id in self._terminais
+
+    def caminho(self, terminal_id):
+        """Arquivo da base do terminal, ou None se o id for inválido ou não houver arquivo"""
+        if not isinstance(terminal_id, str) or not TERMINAL_RE.fullmatch(terminal_id):
+            return None
+        for extensao in EXTENSOES:
+            caminho = os.path.join(self.diretorio, terminal_id + extensao)
+            if os.path.isfile(caminho):
+                return caminho
+        return None
+
+    def obter(self, terminal_id):
+        """ChatBot do terminal, carregando-o se preciso; None se o terminal não existe"""
+        # Antes da busca no dicionário: um id vindo do JSON pode ser uma lista
+        if not isinstance(terminal_id, str):
+            return None
+        terminal = self._terminais.get(terminal_id)
+        if terminal is None:
+            terminal = self._carregar(terminal_id)
+            if terminal is None:
+                return None
+        terminal.ultimo_acesso = self._relogio()
+        return terminal.chatbot
+
+    def _carregar(self, terminal_id):
+        caminho = self.caminho(terminal_id)
+        if caminho is None:
+            return None
+        with self._lock:
+            terminal = self._terminais.get(terminal_id)
+            if terminal is not None:
+                return terminal
+            trava = self._carregando.setdefault(terminal_id, threading.Lock())
+
+        try:
+            with trava:
+                # Outra requisição pode ter carregado o terminal enquanto esta esperava
+                terminal = self._terminais.get(terminal_id)
+                if terminal is not None:
+                    return terminal
+                try:
+                    base = KnowledgeBase(caminho, intervalo=0, compilar=self.compartilhado.detector)
+                except (OSError, ValueError, KeyError, TypeError) as erro:
+                    logger.warning("Terminal %s não carregado (%s): %s", terminal_id, caminho, erro)
+                    return None
+                novo = Terminal(terminal_id, base, self.criar_chatbot(terminal_id, base), self._relogio())
+
+                with self._lock:
+                    terminal = self._terminais.get(terminal_id)
+                    if terminal is not None:
+                        return terminal
+                    while len(self._terminais) >= self.max_terminais:
+                        mais_antigo = min(self._terminais.values(), key=lambda t: t.ultimo_acesso)
+                        del self._terminais[mais_antigo.id]
+                        self.descarregados += 1
+                    self._terminais[terminal_id] = novo
+                    self.carregados += 1
+                return novo
+        finally:
+            with self._lock:
+                if self._carregando.get(terminal_id) is trava:
+                    del self._carregando[terminal_id]
+
+    def descarregar_ociosos(self):
+        """Descarta os terminais sem uso há mais de `ociosidade` segundos. Retorna quantos"""
+        limite = self._relogio() - self.ociosidade
+        with self._lock:
+            ociosos = [t.id for t in self._terminais.values() if t.ultimo_acesso < limite]
+            for terminal_id in ociosos:
+                del self._terminais[terminal_id]
+            self.descarregados += len(ociosos)
+        return len(ociosos)
+
+    def recarregar(self):
+        """Recarrega as bases dos terminais carregados cujos arquivos mudaram"""
+        for terminal in list(self._terminais.values()):
+            terminal.base.recarregar()
+
+    def estatisticas(self):
+        dados = {
+            'terminais_carregados': len(self._terminais),
+            'max_terminais': self.max_terminais,
+            'carregados': self.carregados,
+            'descarregados': self.descarregados,
+        }
+        dados.update(self.compartilhado.estatisticas())
+        return dados
+
+    # Manutenção em segundo plano
+
+    def monitorar(self):
+        if self._thread is not None or self.intervalo <= 0:
+            return
+        self._thread = threading.Thread(target=self._executar, name='tenant-registry', daemon=True)
+        self._thread.start()
+        # Após um fork, cada filho inicia a sua thread
+        registrar_apos_fork(self)
+
+    def _apos_fork(self):
+        self._lock = threading.Lock()
+        self._carregando = {}
+        self._thread = threading.Thread(target=self._executar, name='tenant-registry', daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.descarregar_ociosos()
+            self.recarregar()
+
+    def parar(self):
+        self._parar.set()
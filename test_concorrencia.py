@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Teste de estresse do estado do ChatBot sob concorrência.
+
+Dispara mensagens de um pool de threads contra uma única sessão e contra
+muitas sessões, nos backends em memória e SQLite, e verifica:
+- nenhuma mensagem some do histórico (sem atualizações perdidas);
+- só uma requisição conclui a coleta de contato, ou seja, o protocolo é
+  gerado uma única vez;
+- fluxos de contato em sessões diferentes não se misturam e recebem
+  protocolos diferentes.
+
+Também envia vários /chat/batch com "stream": true ao mesmo tempo pelo modo
+ASGI e verifica que cada um recebe todas as linhas NDJSON.
+
+Também gera milhões de números de protocolo em várias threads de vários
+processos ao mesmo tempo e verifica que não há repetidos e que, em cada
+thread, eles são crescentes.
+
+Uso:
+    python3 test_concorrencia.py [--threads 32] [--rodadas 20]
+    python3 test_concorrencia.py --processos 4 --protocolos 2000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Importar o app não deve deixar arquivos no diretório atual nem recarregar
+# as sessões de uma execução anterior: sem snapshot e sem diário em disco
+os.environ['SESSAO_SNAPSHOT_CAMINHO'] = ''
+os.environ['CONVERSAS_DIRETORIO'] = ''
+
+import asgi  # noqa: E402
+from app import ChatBot  # noqa: E402
+from protocol_ids import ProtocolGenerator  # noqa: E402
+from session_snapshot import MAX_BYTES_ID, SessionSnapshot, gravar_snapshot  # noqa: E402
+from session_store import SessionStore, SQLiteSessionBackend  # noqa: E402
+
+THREADS = 32
+RODADAS = 20
+PROCESSOS = 4
+LOTES_ASGI = 8
+PROTOCOLOS = 2000000
+
+PROTOCOLO_RE = re.compile(r'\*\*Protocolo:\*\* #(\d+)')
+
+
+def criar_backends(diretorio):
+    """Backends a testar, sem limite de histórico para poder contar as mensagens"""
+    return {
+        'memoria': SessionStore(max_historico=None),
+        'sqlite': SQLiteSessionBackend(os.path.join(diretorio, 'sessoes.db'), max_historico=None),
+    }
+
+
+def verificar_historico_sem_perdas(bot, threads, rodadas):
+    """Muitas threads escrevendo na mesma sessão: todas as mensagens ficam registradas"""
+    total = threads * rodadas
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: bot.responder(f"oi {i}", 'compartilhada'), range(total)))
+
+    historico = bot.sessoes.obter('compartilhada').historico
+    assert len(historico) == total, f"esperadas {total} mensagens, encontradas {len(historico)}"
+    assert sorted(item['user'] for item in historico) == sorted(f"oi {i}" for i in range(total))
+
+
+def verificar_protocolo_unico(bot, threads, rodadas):
+    """Várias threads enviando o e-mail ao mesmo tempo: só uma recebe o protocolo"""
+    for rodada in range(rodadas):
+        session_id = f"contato_{rodada}"
+        bot.responder("Quero falar com um atendente", session_id)
+        bot.responder("Maria Souza", session_id)
+        bot.responder("11 98765-4321", session_id)
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            respostas = list(pool.map(lambda _: bot.responder("maria@email.com", session_id),
+                                      range(threads)))
+
+        protocolos = [r for r in respostas if 'Protocolo' in r]
+        assert len(protocolos) == 1, f"rodada {rodada}: {len(protocolos)} protocolos gerados"
+
+
+def verificar_sessoes_independentes(bot, threads, rodadas):
+    """Cada sessão faz o fluxo completo em paralelo com as outras, sem misturar dados"""
+    def fluxo(indice):
+        session_id = f"cliente_{indice}"
+        bot.responder("Preciso de ajuda de um atendente", session_id)
+        bot.responder(f"Cliente {indice}", session_id)
+        bot.responder(f"11 9{indice:04d}-{indice:04d}", session_id)
+        return bot.responder(f"cliente{indice}@email.com", session_id)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        finais = list(pool.map(fluxo, range(threads * rodadas)))
+
+    for indice, resposta in enumerate(finais):
+        assert f"**Nome:** Cliente {indice}\n" in resposta, resposta
+        assert f"cliente{indice}@email.com" in resposta, resposta
+
+    protocolos = [PROTOCOLO_RE.search(resposta).group(1) for resposta in finais]
+    assert len(set(protocolos)) == len(protocolos), "protocolo repetido entre sessões"
+
+
+VERIFICACOES = [
+    verificar_historico_sem_perdas,
+    verificar_protocolo_unico,
+    verificar_sessoes_independentes,
+]
+
+
+# Gerador criado pelo processo principal; os processos filhos criados por
+# fork o herdam e reservam um worker próprio
+_gerador_protocolos = None
+
+
+def _gerar_protocolos(diretorio, threads, por_thread):
+    """Números gerados por várias threads deste processo, em bytes (array 'q')"""
+    gerador = _gerador_protocolos or ProtocolGenerator(diretorio=diretorio)
+
+    def gerar(_):
+        return array('q', (gerador.gerar() for _ in range(por_thread)))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        listas = list(pool.map(gerar, range(threads)))
+
+    for numeros in listas:
+        assert all(a < b for a, b in zip(numeros, numeros[1:])), "protocolos fora de ordem"
+    return b''.join(numeros.tobytes() for numeros in listas)
+
+
+def verificar_protocolos_entre_processos(processos, threads, total):
+    """`total` protocolos gerados por threads de vários processos ao mesmo tempo: nenhum repetido"""
+    global _gerador_protocolos
+    por_thread = max(1, total // ((processos + 1) * threads))
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        _gerador_protocolos = ProtocolGenerator(diretorio=diretorio)
+        try:
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                futuros = [pool.submit(_gerar_protocolos, diretorio, threads, por_thread)
+                           for _ in range(processos)]
+                # O processo principal gera ao mesmo tempo que os filhos
+                partes = [_gerar_protocolos(diretorio, threads, por_thread)]
+                partes.extend(futuro.result() for futuro in futuros)
+        finally:
+            _gerador_protocolos.fechar()
+            _gerador_protocolos = None
+
+    numeros = array('q')
+    for parte in partes:
+        numeros.frombytes(parte)
+    esperados = (processos + 1) * threads * por_thread
+    assert len(numeros) == esperados, f"esperados {esperados} protocolos, gerados {len(numeros)}"
+    assert len(set(numeros)) == len(numeros), f"{len(numeros) - len(set(numeros))} protocolos repetidos"
+    return len(numeros)
+
+
+async def _batch_stream_asgi(numero, itens):
+    """Linhas NDJSON de um /chat/batch com "stream": true atendido por asgi.application"""
+    corpo = json.dumps({'stream': True, 'messages': [
+        {'session_id': f'lote-{numero}-{i % 5}', 'message': f'oi {i}'} for i in range(itens)
+    ]}).encode('utf-8')
+    mensagens = [{'type': 'http.request', 'body': corpo}]
+    enviadas = []
+
+    async def receive():
+        return mensagens.pop(0) if mensagens else {'type': 'http.disconnect'}
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/chat/batch', 'query_string': b'',
+             'headers': [(b'content-type', b'application/json')], 'client': ('127.0.0.1', 0)}
+    await asgi.application(scope, receive, send)
+    assert enviadas[0]['status'] == 200, f"status {enviadas[0]['status']}"
+    assert enviadas[-1].get('more_body') is False, "resposta não terminou"
+    return b''.join(mensagem.get('body', b'') for mensagem in enviadas[1:]).splitlines()
+
+
+def verificar_batch_stream_asgi(lotes, itens):
+    """Vários lotes em streaming ao mesmo tempo pelo ASGI: cada um recebe uma linha por mensagem"""
+    async def todos():
+        return await asyncio.gather(*(_batch_stream_asgi(numero, itens) for numero in range(lotes)))
+
+    for linhas in asyncio.run(todos()):
+        indices = sorted(json.loads(linha)['index'] for linha in linhas)
+        assert indices == list(range(itens)), f"esperadas {itens} linhas, recebidas {len(linhas)}"
+    return lotes * itens
+
+
+def _executar(threads, rodadas):
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome_backend, backend in criar_backends(diretorio).items():
+            for verificacao in VERIFICACOES:
+                inicio = time.perf_counter()
+                verificacao(ChatBot(backend), threads, rodadas)
+                yield nome_backend, verificacao.__name__, time.perf_counter() - inicio
+
+
+def test_concorrencia():
+    for _ in _executar(THREADS, 5):
+        pass
+
+
+def test_batch_stream_asgi():
+    verificar_batch_stream_asgi(LOTES_ASGI, 20)
+
+
+def test_protocolos_entre_processos():
+    verificar_protocolos_entre_processos(2, 8, 200000)
+
+
+def test_protocolo_relogio_para_tras():
+    """Um ajuste do relógio do sistema para trás não faz gerar() esperar"""
+    ajuste = [0.0]
+    gerador = ProtocolGenerator(worker_id=0, relogio=lambda: time.time() + ajuste[0])
+    try:
+        antes = [gerador.gerar() for _ in range(10)]
+        ajuste[0] = -5.0
+        inicio = time.perf_counter()
+        # Mais de 4096 números: passa pelo caminho que espera o próximo milissegundo
+        depois = [gerador.gerar() for _ in range(10000)]
+        assert time.perf_counter() - inicio < 1.0, "gerar() esperou o relógio voltar"
+        numeros = antes + depois
+        assert all(a < b for a, b in zip(numeros, numeros[1:])), "protocolos fora de ordem"
+    finally:
+        gerador.fechar()
+
+
+def test_snapshot_session_id_longo():
+    """Um session_id que não cabe no registro fica fora do snapshot sem impedir as demais sessões"""
+    agora = time.time()
+    sessoes = [('x' * (MAX_BYTES_ID + 1), {}, [], agora), ('curta', {'etapa': 1}, [], agora)]
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'sessoes.snapshot')
+        novo, _ = gravar_snapshot(caminho, sessoes)
+        novo.fechar()
+        snapshot = SessionSnapshot(caminho)
+        try:
+            assert snapshot.total == 1
+            assert snapshot.restaurar('curta')[0] == {'etapa': 1}
+        finally:
+            snapshot.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=THREADS)
+    parser.add_argument('--rodadas', type=int, default=RODADAS)
+    parser.add_argument('--processos', type=int, default=PROCESSOS)
+    parser.add_argument('--protocolos', type=int, default=PROTOCOLOS)
+    args = parser.parse_args()
+
+    for nome_backend, verificacao, tempo in _executar(args.threads, args.rodadas):
+        print(f"✅ [{nome_backend}] {verificacao} ({tempo:.2f}s)")
+
+    inicio = time.perf_counter()
+    total = verificar_batch_stream_asgi(LOTES_ASGI, args.rodadas)
+    print(f"✅ verificar_batch_stream_asgi: {total} mensagens em {LOTES_ASGI} lotes "
+          f"({time.perf_counter() - inicio:.2f}s)")
+
+    inicio = time.perf_counter()
+    total = verificar_protocolos_entre_processos(args.processos, args.threads, args.protocolos)
+    print(f"✅ verificar_protocolos_entre_processos: {total} protocolos em {args.processos + 1} processos "
+          f"({time.perf_counter() - inicio:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()